@@ -51,10 +51,13 @@ APPSLIST_NUMBER_OF_LINES = 3
 APPSLIST_FRICTION = 5
 APPSLIST_PADDING_X = 100
 APPSLIST_PADDING_Y = 40
+APPSLIST_PREFETCH_COLUMNS = 2 # columns off screen, on each side, that already have buttons
+APPSLIST_PAGE_SIZE = 60 # applications read from the database at a time
 APPSLIST_POPUP_DURATION = 5.0
 APPSLIST_STAR_ONLY_WHEN_ORDER_BY_RATING = True # If false star is always showed
 APPSLIST_BTN_SIZE = (100,100)
 APPSLIST_BTN_IMAGE_SIZE = (80,80)
+APPSLIST_BTN_HIGH_DPI = False # Draw the icon thumbnails made at twice APPSLIST_BTN_IMAGE_SIZE
 APPSLIST_BTN_FONT_SIZE = 10
 APPSLIST_BTN_POPUPS_PER_BTN = 1
 
@@ -72,9 +75,26 @@ HELPPOPUP_POSITION = (int((MAINWINDOW_SIZE[0] - HELPPOPUP_SIZE[0]) / 2),
 
 APPPOPUP_SIZE = (270,255)
 
+# IMAGES DRAWN BY THE WIDGETS
+TEXTURE_CACHE_BUDGET = 64 * 1024 * 1024 # bytes of decoded images kept, least recently drawn dropped first
+TEXTURE_CACHE_CHECK_INTERVAL = 5 # seconds between checks for a changed file
+TEXT_FIT_CACHE_SIZE = 2048 # labels fitted to a width kept for the next frames
+
 INACTIVITY_POOL_INTERVAL = 5
 UNAVAILABLE_PROJECTORS_TIME = 2
 TIME_TO_CHECK_PROJECTORS = 10
+PROJECTORS_STATUS_TTL = 30 # seconds the cached projectors state is used before polling again
+
+# STATISTICS AND LOGS WRITE-BEHIND
+WRITEBEHIND_JOURNAL = relative('logs', 'writebehind.journal')
+WRITEBEHIND_INTERVAL = 30 # seconds between writes to the database
+WRITEBEHIND_BATCHES_KEPT = 1000 # written batches remembered, so a journal replayed after a crash isn't counted twice
+
+# APPLICATIONS OUTPUT
+CAPTURE_HEAD_BYTES = 16 * 1024 # first bytes of a run kept in memory and stored in the log
+CAPTURE_TAIL_BYTES = 64 * 1024 # last bytes of a run kept in memory and stored in the log
+CAPTURE_RUN_LOGS_PATH = relative('logs', 'runs') # full output of each run, None to disable
+CAPTURE_RUN_LOGS_KEPT = 5 # runs whose full output is kept, per application
 
 # LAUCHING APPLICATION SETTINGS
 MAX_ATTEMPTS = 3
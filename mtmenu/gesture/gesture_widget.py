@@ -25,9 +25,9 @@ class GestureWidget( MTGestureWidget ):
 
         logger.debug("PROJECTORS STATE: %d" % self.activity_checker.projectors_on)
 
-        if not self.activity_checker.projectors_on:
+        if not self.activity_checker.update_projectors_status():
             logger.info('Turning Projectors On')
-            self.activity_checker.turn_projectors_power(1)
+            self.activity_checker.turn_projectors_power_async(1)
         self.activity_checker.set_last_activity()
             
         logger.debug('gesture: %d' % self.counter)
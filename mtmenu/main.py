@@ -10,6 +10,10 @@ if __name__ == '__main__':
     # TUIO proxy
     proxy.start()
     
+    # STATISTICS AND LOGS
+    from writebehind import write_behind
+    write_behind.start()
+    
     # BACKGROUND
     main_window.add_widget(background_image)
     
@@ -26,3 +30,5 @@ if __name__ == '__main__':
     main_window.add_widget(GestureScan(activity_checker))
     
     runTouchApp()
+    
+    write_behind.stop()
@@ -1,10 +1,10 @@
 import sys
 from os import environ, path
 from subprocess import Popen, PIPE
-from config import APPS_REPOSITORY_PATH, APPS_BOOT_FILENAME, PRODUCTION
-from cStringIO import StringIO
+from config import APPS_REPOSITORY_PATH, APPS_BOOT_FILENAME, PRODUCTION, APPSLIST_BTN_IMAGE_SIZE, APPSLIST_BTN_HIGH_DPI
 from threading import Thread
 from mtmenu import logger
+from mtmenu.output_capture import OutputCapture, run_log_path
 from mtmenu.application_running import set_app_running, remove_app_running, get_app_running, is_app_running, get_app_mutex
 # Go back one directory and adds it to sys.path
 sys.path.append('..')
@@ -18,7 +18,9 @@ else:
 
 # webmanager models can now be imported
 from webmanager.appman import models
+from webmanager.appman.utils.thumbnails import make_thumbnails, thumbnail_path
 from django.contrib.auth.models import User
+from mtmenu.writebehind import write_behind
 
 class WallModelsProxy ():
     """This is an abstraction to be used by all models extended from appman"""
@@ -45,8 +47,9 @@ class ApplicationProxy(models.Application, WallModelsProxy):
     def _execute(self, is_screensaver):
         """Tries to execute application's batch file.
         
-        While is executing all process output (stdout/stderr) is catched 
-        and handled later on when the application is terminated. 
+        While is executing all process output (stdout/stderr) is captured
+        with bounded memory and its head and tail are logged when the
+        application is terminated. 
         
         This method blocks until the application exits. Use run() instead.
 
@@ -81,8 +84,10 @@ class ApplicationProxy(models.Application, WallModelsProxy):
                 
                 command = self.build_command(app_boot_file)
                 
-                # Starts application process and waits for it to terminate
+                # Starts application process and captures its output as it is written
                 process = Popen(command, stdout = PIPE, stderr = PIPE, cwd = self.get_extraction_fullpath(), shell = False)
+                capture = OutputCapture((process.stdout, process.stderr), run_log_path(self.id))
+                capture.start()
                 
                 # defines the application that is running
                 set_app_running(process)
@@ -91,10 +96,9 @@ class ApplicationProxy(models.Application, WallModelsProxy):
                 from utils import bring_window_to_front
                 bring_window_to_front(True)
                 
-                # Concatenate output
-                output = StringIO()
-                for line in process.communicate():
-                    output.write(line)
+                # Waits for it to terminate
+                process.wait()
+                capture.join()
 
 
                 remove_app_running()
@@ -103,8 +107,8 @@ class ApplicationProxy(models.Application, WallModelsProxy):
                         
                 self.end_run()                
                 
-                # Save output to database
-                self.add_log_entry(output.getvalue())    
+                # Save head and tail of the output to database
+                self.add_log_entry(capture.summary())    
                     
                 success = True
                 logger.info("Application %s terminated" % self.name)
@@ -133,6 +137,27 @@ class ApplicationProxy(models.Application, WallModelsProxy):
         else:
             return ""
         
+    def get_icon_path(self):
+        """Full path to the icon thumbnail drawn on the wall.
+        
+        Thumbnails are made when the application is saved; the ones missing
+        (e.g. icons uploaded before) are made here.
+
+        Returns:
+            Full path to the thumbnail, or to the uploaded icon if it can't
+            be made. None if the application has no icon"""
+        if not self.icon:
+            return None
+        size = APPSLIST_BTN_IMAGE_SIZE
+        if APPSLIST_BTN_HIGH_DPI:
+            size = (size[0] * 2, size[1] * 2)
+        try:
+            make_thumbnails(self.icon.name)
+        except Exception, e: #Pokemon
+            logger.error("EXCEPTION making icon thumbnails\n%s" % e)
+            return self.icon.path
+        return thumbnail_path(self.icon.name, size)
+        
     def build_command(self, boot_file):
         """ Returns the command to be executed on the shell """
         import platform
@@ -162,27 +187,34 @@ class ApplicationProxy(models.Application, WallModelsProxy):
         Parameters:
             - app_log_text: Debug text to be added"""
             
-        # Adds entry to database
-        log = ApplicationLogProxy.objects.create(application = self, error_description = app_log_text)
+        # Written to the database later on by the write-behind buffer
+        write_behind.add_log(self.id, app_log_text)
         
     def vote(self, like):
         if like:
             self.likes = self.likes + 1
         else:
             self.dislikes = self.dislikes + 1
-        self.save()
+        self.update_rating()
+        write_behind.vote(self.id, like)
             
     def start_run(self):
-        self.is_running = True
-        self.save(False, True)
+        # Not buffered: the web manager must see it right away to keep the
+        # application from being edited or removed while it runs
+        self.set_running(True)
         
     def end_run(self):
-        self.is_running = False
+        self.set_running(False)
         self.add_run()
-        self.save(False, True)
         
     def add_run(self):
         self.runs = self.runs + 1
+        write_behind.add_run(self.id)
+        
+    def set_running(self, is_running):
+        """Flags the application as running with a single UPDATE, without sending signals"""
+        self.is_running = is_running
+        ApplicationProxy.objects.filter(pk=self.pk).update(is_running=is_running)
 
             
 class CategoryProxy(models.Category, WallModelsProxy):
@@ -0,0 +1,133 @@
+"""
+Streaming capture of the output of a running application.
+
+Both pipes are read by background threads as the application writes to
+them, so it never blocks on a full pipe. Only the first CAPTURE_HEAD_BYTES
+and the last CAPTURE_TAIL_BYTES are kept in memory, whatever the runtime;
+the whole output can also be written to a file per run, of which the last
+CAPTURE_RUN_LOGS_KEPT are kept for each application.
+
+Offsets count bytes since the start of the run, over both pipes in the
+order the data arrived. While the application runs, its file carries the
+RUNNING_SUFFIX, which lets the web manager tail it live. On Windows a file
+that is open elsewhere (e.g. by that tail) can't be renamed or removed;
+this is logged and tried again before the next run of the application.
+"""
+
+import os
+from datetime import datetime
+from threading import Thread, Lock
+
+from config import CAPTURE_HEAD_BYTES, CAPTURE_TAIL_BYTES, CAPTURE_RUN_LOGS_PATH, CAPTURE_RUN_LOGS_KEPT
+from mtmenu import logger
+
+__all__ = ['OutputCapture', 'run_log_path']
+
+READ_SIZE = 4096
+RUNNING_SUFFIX = '.running'
+
+
+def finish_run_log(path):
+    """ Drops the RUNNING_SUFFIX of the file of a finished run. Returns False if it couldn't. """
+    try:
+        os.rename(path + RUNNING_SUFFIX, path)
+        return True
+    except OSError, e:
+        logger.error("Could not rename run log %s: %s" % (path + RUNNING_SUFFIX, e))
+        return False
+
+
+def run_log_path(app_id, folder=CAPTURE_RUN_LOGS_PATH, kept=CAPTURE_RUN_LOGS_KEPT):
+    ''' Returns the file for the output of a new run of an application, removing the oldest ones '''
+    if not folder:
+        return None
+    folder = os.path.join(folder, str(app_id))
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    # Runs that ended while their file couldn't be renamed
+    for name in os.listdir(folder):
+        if name.endswith(RUNNING_SUFFIX):
+            finish_run_log(os.path.join(folder, name[:-len(RUNNING_SUFFIX)]))
+    runs = sorted(os.listdir(folder))
+    for name in runs[:max(0, len(runs) - kept + 1)]:
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError, e:
+            logger.error("Could not remove old run log %s: %s" % (name, e))
+    return os.path.join(folder, datetime.now().strftime('%Y%m%d-%H%M%S-%f.log'))
+
+
+class OutputCapture(object):
+
+    def __init__(self, streams, path=None, head_size=CAPTURE_HEAD_BYTES, tail_size=CAPTURE_TAIL_BYTES):
+        self.streams = streams
+        self.path = path
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.lock = Lock()
+        self.head = ''
+        self.tail = ''
+        self.size = 0
+        self.file = None
+        self.threads = []
+
+    def start(self):
+        if self.path:
+            self.file = open(self.path + RUNNING_SUFFIX, 'wb')
+        for stream in self.streams:
+            t = Thread(target=self.read, args=(stream,))
+            t.setDaemon(True)
+            t.start()
+            self.threads.append(t)
+
+    def read(self, stream):
+        fd = stream.fileno()
+        while True:
+            data = os.read(fd, READ_SIZE)
+            if not data:
+                break
+            self.write(data)
+        stream.close()
+
+    def write(self, data):
+        self.lock.acquire()
+        try:
+            if self.file:
+                self.file.write(data)
+                self.file.flush()
+            self.size += len(data)
+            if len(self.head) < self.head_size:
+                missing = self.head_size - len(self.head)
+                self.head += data[:missing]
+                data = data[missing:]
+            if data:
+                self.tail = (self.tail + data)[-self.tail_size:]
+        finally:
+            self.lock.release()
+
+    def join(self):
+        """ Waits for both pipes to be closed, i.e. for the application to exit """
+        for t in self.threads:
+            t.join()
+        if self.file:
+            self.file.close()
+            self.file = None
+            finish_run_log(self.path)
+
+    def skipped(self):
+        """ Number of bytes between the head and the tail that are not in memory """
+        return self.size - len(self.head) - len(self.tail)
+
+    def summary(self):
+        """ The output to be stored in the application's log, with the middle cut out if too long """
+        self.lock.acquire()
+        try:
+            skipped = self.skipped()
+            if not skipped:
+                return self.head + self.tail
+            note = "\n[... %d bytes skipped" % skipped
+            if self.path:
+                note += ", full output in %s" % self.path
+            return self.head + note + " ...]\n" + self.tail
+        finally:
+            self.lock.release()
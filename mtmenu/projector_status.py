@@ -0,0 +1,138 @@
+"""
+Cached state of the projectors.
+
+A background thread polls every projector at the same time and keeps the
+last answer of each one (ON, OFF, COOL_DOWN or UNREACHABLE). Readers get
+that answer straight away and never wait on the network. The state is
+refreshed every PROJECTORS_STATUS_TTL seconds, or as soon as it is
+invalidated. A poll that was already under way when the state was
+invalidated is discarded, as its answers may predate the change.
+
+While a power command runs (between begin_command() and end_command())
+the projectors are not polled and the state it should bring is assumed;
+the first poll started after the command replaces it.
+"""
+
+import time
+from threading import Thread, Condition, Lock
+
+from webmanager.appman.utils import projectors
+from config import PROJECTORS_STATUS_TTL
+from mtmenu import logger
+
+__all__ = ['ProjectorStatusService', 'projector_status']
+
+
+class ProjectorStatusService(object):
+
+    def __init__(self, ttl=PROJECTORS_STATUS_TTL, poll=projectors.projector_states):
+        self.ttl = ttl
+        self.poll = poll
+        self.lock = Lock()
+        self.changed = Condition(self.lock)
+        self.states = {}
+        self.updated = None
+        self.generation = 0  # Increased by each invalidate()
+        self.commands = 0  # Power commands under way
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = Thread(target=self.work)
+            self.thread.setDaemon(True)
+            self.thread.start()
+
+    def work(self):
+        while True:
+            self.refresh()
+            self.lock.acquire()
+            try:
+                if self.is_fresh() or self.commands:
+                    self.changed.wait(self.ttl)
+            finally:
+                self.lock.release()
+
+    def refresh(self):
+        """ Polls the projectors and stores their states, unless invalidated meanwhile.
+        Does nothing while a power command runs. """
+        self.lock.acquire()
+        try:
+            if self.commands:
+                return
+            generation = self.generation
+        finally:
+            self.lock.release()
+        try:
+            states = self.poll()
+        except Exception, e: #Pokemon
+            logger.error("Projectors status error:\n%s" % e)
+            states = None
+        self.lock.acquire()
+        try:
+            if generation != self.generation:
+                return
+            if states is not None:
+                self.states = states
+            self.updated = time.time()
+        finally:
+            self.lock.release()
+
+    def is_fresh(self):
+        return self.updated is not None and time.time() - self.updated < self.ttl
+
+    def invalidate(self, expected=None):
+        """ Asks for a new poll right away.
+
+        expected, e.g. 'ON' after switching the projectors on, is assumed
+        for the reachable projectors until the poll answers, so a second
+        touch doesn't send the command again. """
+        self.lock.acquire()
+        try:
+            if expected:
+                for ip, state in self.states.items():
+                    if state != projectors.UNREACHABLE:
+                        self.states[ip] = expected
+            self.updated = None
+            self.generation += 1
+            self.changed.notifyAll()
+        finally:
+            self.lock.release()
+
+    def begin_command(self, expected):
+        """ Called before sending a power command; expected is the state it should bring """
+        self.lock.acquire()
+        try:
+            self.commands += 1
+        finally:
+            self.lock.release()
+        self.invalidate(expected)
+
+    def end_command(self):
+        """ Called once the command returned, failed or not. Polls that overlapped it are dropped. """
+        self.lock.acquire()
+        try:
+            self.commands -= 1
+        finally:
+            self.lock.release()
+        self.invalidate()
+
+    def get_states(self):
+        """ {ip: state} as last known """
+        self.lock.acquire()
+        try:
+            return dict(self.states)
+        finally:
+            self.lock.release()
+
+    def any_on(self):
+        """ True if a reachable projector isn't OFF, None if none could be reached """
+        reachable = [state for state in self.get_states().values() if state != projectors.UNREACHABLE]
+        if not reachable:
+            return None
+        for state in reachable:
+            if state != 'OFF':
+                return True
+        return False
+
+
+projector_status = ProjectorStatusService()
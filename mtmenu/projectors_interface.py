@@ -12,6 +12,7 @@ from datetime import datetime
 from threading import Thread
 from config import SATURDAY
 from mtmenu import logger
+from projector_status import projector_status
 
 
 class ActivityChecker():
@@ -21,6 +22,7 @@ class ActivityChecker():
         self.last_activity = datetime.now()
         self.projectors_on = self.in_schedule()
         
+        projector_status.start()
         Thread( target=self.last_activity_checker ).start()
 
 
@@ -40,16 +42,11 @@ class ActivityChecker():
         
         
     def update_projectors_status(self):
-        try:
-            dic = projectors.projectors_status()
-            for key, value in dic.items():
-                if not value == 'OFF':
-                    self.set_projectors_status(True)
-                    return
-
-            self.set_projectors_status(False)
-        except Exception as e:
-            logger.error("Projectors status error:\n%s" % e)
+        """ Takes the state cached by the projector status service, without waiting on the network """
+        on = projector_status.any_on()
+        if on is not None:
+            self.set_projectors_status(on)
+        return self.projectors_on
     
     
     def last_activity_checker(self):
@@ -95,11 +92,20 @@ class ActivityChecker():
             logger.info("NOT IN SCHEDULE. Projectors will remain with the previous state")
             return
         
+        # Assumed to work until a poll after the command says otherwise
+        projector_status.begin_command(status and 'ON' or 'OFF')
         try:
             projectors.projectors_power(status)
             logger.info("Projectors status changed to %d" % status)
         except Exception, e:
             logger.error('Error changing projectors status:\n%s' % e)
+        projector_status.end_command()
+        self.update_projectors_status()
+    
+    
+    def turn_projectors_power_async(self, status):
+        """ Sends the power command from another thread, so the touch that asked for it isn't held up """
+        Thread( target=self.turn_projectors_power, args=(status,) ).start()
     
     
     def in_schedule(self):
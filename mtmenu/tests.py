@@ -6,6 +6,13 @@ from unittest import TestLoader, TextTestRunner
 
 from mtmenu.config import relative
 from mtmenu.application_running import get_app_running, kill_app_running, is_app_running
+from mtmenu.writebehind import WriteBehindBuffer, write_behind
+from mtmenu.output_capture import OutputCapture, run_log_path
+from mtmenu.projector_status import ProjectorStatusService
+from mtmenu.texture_cache import TextureCache
+from mtmenu.text_fitting import TextFitter
+from mtmenu.ui.kineticgrid import PagedRows, VirtualKineticGrid
+from mtmenu.ui.appbutton import AppButton
 
 # TODO Disabled for SQLite3
 ApplicationProxy.start_run = lambda x: True
@@ -45,11 +52,284 @@ class TestMultiTouch(TestCase):
         log_message2 = "Log message 2 (two)"
         self.tetris.add_log_entry(log_message1)
         self.tetris.add_log_entry(log_message2)
+        write_behind.flush()
         
         logs = ApplicationLogProxy.objects.filter(application = self.tetris)
         
         self.assertEqual(logs[logs.count() - 1].error_description, log_message2)
     
+    def test_write_behind(self):
+        """ Tests if buffered votes and runs are written in one go, and replayed after a crash """
+        journal = relative('test.journal')
+        buffer = WriteBehindBuffer(journal)
+        buffer.vote(self.tetris.id, True)
+        buffer.vote(self.tetris.id, True)
+        buffer.add_run(self.tetris.id)
+        self.assertEqual(ApplicationProxy.objects.get(id=self.tetris.id).likes, 0)
+        
+        # A new buffer on the same journal stands for the menu starting after a crash
+        recovered = WriteBehindBuffer(journal)
+        recovered.recover()
+        self.assert_(recovered.flush())
+        tetris = ApplicationProxy.objects.get(id=self.tetris.id)
+        self.assertEqual((tetris.likes, tetris.runs), (2, 1))
+        self.assertFalse(os.path.exists(journal))
+        self.assertFalse(os.path.exists(journal + '.flushing'))
+    
+    def test_write_behind_replay(self):
+        """ Tests if a journal whose batch was written before a crash isn't counted again """
+        journal = relative('test.journal')
+        buffer = WriteBehindBuffer(journal)
+        buffer.add_run(self.tetris.id)
+        contents = open(journal).read()
+        self.assert_(buffer.flush())
+        
+        # The crash came after the commit, before the journal was deleted
+        open(journal + '.flushing', 'w').write(contents)
+        recovered = WriteBehindBuffer(journal)
+        recovered.recover()
+        self.assertEqual(recovered.pending(), 0)
+        self.assert_(recovered.flush())
+        self.assertEqual(ApplicationProxy.objects.get(id=self.tetris.id).runs, 1)
+        self.assertFalse(os.path.exists(journal + '.flushing'))
+    
+    def test_write_behind_running(self):
+        """ Tests if the running flag is written right away and never replayed """
+        from django.utils import simplejson
+        journal = relative('test.journal')
+        open(journal, 'w').write(simplejson.dumps({'app': self.tetris.id, 'running': True}) + '\n')
+        self.tetris.set_running(False)
+        
+        recovered = WriteBehindBuffer(journal)
+        recovered.recover()
+        self.assertEqual(recovered.pending(), 0)
+        self.assert_(recovered.flush())
+        self.assertFalse(ApplicationProxy.objects.get(id=self.tetris.id).is_running)
+        
+        self.tetris.set_running(True)
+        self.assert_(ApplicationProxy.objects.get(id=self.tetris.id).is_running)
+    
+    def test_output_capture(self):
+        """ Tests if only the head and tail of a long output are kept in memory """
+        read_fd, write_fd = os.pipe()
+        capture = OutputCapture([os.fdopen(read_fd, 'rb')], head_size=10, tail_size=10)
+        capture.start()
+        writer = os.fdopen(write_fd, 'wb')
+        writer.write("head of the output" + "." * 100000 + "end of the output")
+        writer.close()
+        capture.join()
+        
+        self.assertEqual(capture.size, 100035)
+        self.assertEqual(capture.head, "head of th")
+        self.assertEqual(capture.tail, "the output")
+        self.assertEqual(capture.summary(), "head of th\n[... 100015 bytes skipped ...]\nthe output")
+    
+    def test_run_log_path(self):
+        """ Tests if run files that couldn't be renamed or removed are dealt with on the next run """
+        import tempfile, shutil
+        root = tempfile.mkdtemp()
+        folder = os.path.join(root, str(self.tetris.id))
+        os.makedirs(folder)
+        # The file of a run that ended while it was open elsewhere
+        open(os.path.join(folder, '20100101-000000-000000.log.running'), 'w').write('output')
+        # Something os.remove can't remove, as a file open on Windows
+        os.mkdir(os.path.join(folder, '20090101-000000-000000.log'))
+        
+        path = run_log_path(self.tetris.id, folder=root, kept=2)
+        self.assertEqual(os.path.dirname(path), folder)
+        self.assertEqual(sorted(os.listdir(folder)), ['20090101-000000-000000.log', '20100101-000000-000000.log'])
+        shutil.rmtree(root)
+    
+    def test_projector_status_cache(self):
+        """ Tests if the projectors state is read from the cache and invalidated by power commands """
+        polls = []
+        def poll():
+            polls.append(1)
+            return {'a': 'OFF', 'b': 'UNREACHABLE'}
+        service = ProjectorStatusService(ttl=60, poll=poll)
+        self.assertEqual(service.any_on(), None)
+        
+        service.refresh()
+        self.assertEqual(service.any_on(), False)
+        self.assert_(service.is_fresh())
+        
+        service.invalidate('ON')
+        self.assertEqual(service.get_states(), {'a': 'ON', 'b': 'UNREACHABLE'})
+        self.assertFalse(service.is_fresh())
+        self.assertEqual(len(polls), 1)
+    
+    def test_projector_status_invalidated_poll(self):
+        """ Tests if a poll under way when the state is invalidated doesn't overwrite it """
+        def poll():
+            # The projectors are switched on while they answer
+            service.invalidate('ON')
+            return {'a': 'OFF'}
+        service = ProjectorStatusService(ttl=60, poll=lambda: {'a': 'OFF'})
+        service.refresh()
+        
+        service.poll = poll
+        service.refresh()
+        self.assertEqual(service.get_states(), {'a': 'ON'})
+        self.assertFalse(service.is_fresh())
+    
+    def test_projector_status_command(self):
+        """ Tests if polls during a power command don't replace the state it should bring """
+        polls = []
+        def poll():
+            polls.append(1)
+            return {'a': 'OFF'}
+        service = ProjectorStatusService(ttl=60, poll=poll)
+        service.refresh()
+        
+        service.begin_command('ON')
+        service.refresh()
+        self.assertEqual(len(polls), 1)
+        self.assertEqual(service.get_states(), {'a': 'ON'})
+        
+        service.end_command()
+        self.assertEqual(service.get_states(), {'a': 'ON'})
+        self.assertFalse(service.is_fresh())
+        
+        # A poll under way while a whole command runs
+        def overlapping_poll():
+            service.begin_command('ON')
+            service.end_command()
+            return {'a': 'OFF'}
+        service.poll = overlapping_poll
+        service.refresh()
+        self.assertEqual(service.get_states(), {'a': 'ON'})
+        self.assertFalse(service.is_fresh())
+        
+        # The first poll started after the command answers
+        service.poll = poll
+        service.refresh()
+        self.assertEqual(service.get_states(), {'a': 'OFF'})
+        self.assert_(service.is_fresh())
+    
+    def test_texture_cache(self):
+        """ Tests if images are loaded once, reloaded when changed and evicted over budget """
+        import tempfile
+        class FakeImage(object):
+            width = height = 10
+            def __init__(self, path):
+                if not os.path.exists(path):
+                    raise IOError(path)
+                loads.append(path)
+        loads = []
+        folder = tempfile.mkdtemp()
+        paths = [os.path.join(folder, name) for name in ('a.png', 'b.png', 'c.png')]
+        for path in paths:
+            open(path, 'w').write('image')
+        cache = TextureCache(budget=2 * 10 * 10 * 4, check_interval=0, loader=FakeImage)
+        
+        first = cache.get(paths[0])
+        self.assert_(cache.get(paths[0]) is first)
+        self.assertEqual(len(loads), 1)
+        
+        os.utime(paths[0], (0, 0))
+        self.assert_(cache.get(paths[0]) is not first)
+        self.assertEqual(len(loads), 2)
+        
+        cache.get(paths[1])
+        cache.get(paths[0])
+        cache.get(paths[2])
+        self.assertEqual(sorted(cache.entries.keys()), [paths[0], paths[2]])
+        self.assertEqual(cache.size, 2 * 10 * 10 * 4)
+        
+        self.assertRaises(Exception, cache.get, os.path.join(folder, 'missing.png'))
+        for path in paths:
+            os.remove(path)
+        os.rmdir(folder)
+    
+    def test_text_fitting(self):
+        """ Tests if labels are trimmed to the width with few measures and reused """
+        class FakeLabel(object):
+            def __init__(self, label, pos, font_size, autowidth):
+                built.append(label)
+                self.label, self.pos = label, pos
+                self.width = len(label) * font_size
+        built = []
+        fitter = TextFitter(label_class=FakeLabel)
+        
+        label, text = fitter.fit('Short', (0, 0), 10, 100)
+        self.assertEqual(text, 'Short')
+        
+        long_name = 'A very long application name'
+        label, text = fitter.fit(long_name, (0, 0), 10, 100)
+        self.assertEqual(text, 'A very ...')
+        self.assertEqual(label.label, 'A very ...')
+        self.assert_(label.width <= 100)
+        
+        built_before = len(built)
+        again, text = fitter.fit(long_name, (5, 5), 10, 100)
+        self.assert_(again is label)
+        self.assertEqual(again.pos, (5, 5))
+        self.assert_(fitter.fit(text, (0, 0), 10, 100)[0] is label)
+        self.assertEqual(len(built), built_before)
+    
+    def test_paged_rows(self):
+        """ Tests if applications are read from the database only in the pages needed """
+        for name in ('Arkanoid', 'Chess', 'Pong', 'Snake'):
+            ApplicationProxy.objects.create(name=name, owner=self.user, category=self.games)
+        apps = ApplicationProxy.objects.order_by('name')
+        rows = PagedRows(apps, 2)
+        
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows.pages, {})
+        self.assertEqual(rows[3].name, 'Snake')
+        self.assertEqual(rows.pages.keys(), [1])
+        self.assertEqual([rows[i].name for i in range(5)], [app.name for app in apps])
+        self.assertEqual(sorted(rows.pages.keys()), [0, 1, 2])
+        self.assertRaises(IndexError, lambda: rows[5])
+    
+    def test_grid_refresh(self):
+        """ Tests if refreshing the grid keeps the widgets of the items still in view """
+        def create_item(item):
+            created.append(item)
+            widget = MTWidget()
+            widget.item = item
+            return widget
+        def update_item(widget, item):
+            updated.append(item)
+            widget.item = item
+        created, updated = [], []
+        grid = VirtualKineticGrid(create_item, update_item,
+                                  size=(1000, 500), rows=3, item_size=(100, 100), padding_x=100, prefetch=0)
+        grid.set_source(range(100))
+        grid.layout()
+        self.assertEqual(len(created), 18)
+        widgets = dict([(widget.item, widget) for widget in grid.visible.values()])
+        
+        # 0 to 6 removed and 50 moved first: 7 to 17 keep their widgets,
+        # the other items in view take the widgets of the removed ones
+        grid.set_source([50] + range(7, 100), keep_offset=True)
+        self.assertEqual(len(created), 18)
+        self.assert_(grid.visible[1] is widgets[7])
+        self.assertEqual(sorted(updated), range(7, 24) + [50])
+        self.assertEqual(sorted([widget.item for widget in grid.visible.values()]), range(7, 24) + [50])
+        self.assertEqual(len(grid.children), 18)
+    
+    def test_button_recycle(self):
+        """ Tests if the popups of an application are closed when its button shows another one """
+        class FakePopup(object):
+            def close(self):
+                closed.append(self)
+                button.popup_closed(self)
+        closed = []
+        snake = ApplicationProxy.objects.create(name="Snake", owner=self.user, category=self.games)
+        button = AppButton(self.tetris)
+        button.popups = [FakePopup(), FakePopup()]
+        
+        button.set_app(self.tetris)
+        self.assertEqual(len(button.popups), 2)
+        button.set_app(snake)
+        self.assertEqual(button.popups, [])
+        self.assertEqual(len(closed), 2)
+        
+        # Closing again, e.g. by its timer, changes nothing
+        closed[0].close()
+        self.assertEqual(button.popups, [])
+    
     def test_run_application(self):
         """ Tests running an application """
         import time
@@ -0,0 +1,92 @@
+"""
+Fitting of label texts into a maximum width.
+
+The width of each character is measured once per font size, so the width
+of any text is a sum, and the longest prefix that fits along with the
+ellipsis is found by binary search instead of building a label for each
+character removed. The label is built once for each (text, font_size,
+max_width) and then handed out on every frame: callers set its pos right
+before drawing it.
+
+Kerning can make a label a little wider than the sum of its characters,
+so the label built is measured and the text cut further if needed.
+"""
+
+from threading import Lock
+
+from pymt import MTLabel
+from config import TEXT_FIT_CACHE_SIZE
+
+__all__ = ['TextFitter', 'text_fitter']
+
+ELLIPSIS = '...'
+
+
+class TextFitter(object):
+
+    def __init__(self, label_class=MTLabel, cache_size=TEXT_FIT_CACHE_SIZE):
+        self.label_class = label_class
+        self.cache_size = cache_size
+        self.lock = Lock()
+        self.widths = {}  # (font_size, character) -> width
+        self.fitted = {}  # (text, font_size, max_width) -> (label, text)
+
+    def fit(self, text, position, font_size, max_width):
+        """ The label of text trimmed to max_width, '...' added if trimmed, and its text.
+
+        Return: (label_object, label_text_after_trim) """
+        key = (text, font_size, max_width)
+        self.lock.acquire()
+        try:
+            fitted = self.fitted.get(key)
+            if fitted is None:
+                if len(self.fitted) >= self.cache_size:
+                    self.fitted.clear()
+                fitted = self.fitted[key] = self.build(text, position, font_size, max_width)
+                # Callers pass the trimmed text back on the next frame
+                self.fitted[(fitted[1], font_size, max_width)] = fitted
+        finally:
+            self.lock.release()
+        label_obj, text = fitted
+        label_obj.pos = position
+        return label_obj, text
+
+    def build(self, text, position, font_size, max_width):
+        if self.text_width(text, font_size) <= max_width:
+            label_obj = self.label(text, position, font_size)
+            if label_obj.width <= max_width:
+                return label_obj, text
+
+        # The longest prefix that fits with the ellipsis
+        available = max_width - self.text_width(ELLIPSIS, font_size)
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) / 2
+            if self.text_width(text[:middle], font_size) <= available:
+                low = middle
+            else:
+                high = middle - 1
+
+        label_obj = self.label(text[:low] + ELLIPSIS, position, font_size)
+        while label_obj.width > max_width and low > 0:
+            low -= 1
+            label_obj = self.label(text[:low] + ELLIPSIS, position, font_size)
+        return label_obj, text[:low] + ELLIPSIS
+
+    def text_width(self, text, font_size):
+        width = 0
+        for character in text:
+            key = (font_size, character)
+            if key not in self.widths:
+                self.widths[key] = self.label(character, (0, 0), font_size).width
+            width += self.widths[key]
+        return width
+
+    def label(self, text, position, font_size):
+        return self.label_class(label=text,
+                                pos=position,
+                                font_size=font_size,
+                                autowidth=True)
+
+
+text_fitter = TextFitter()
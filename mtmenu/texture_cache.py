@@ -0,0 +1,112 @@
+"""
+Process-wide cache of the images drawn by the widgets.
+
+Widgets are redrawn every frame; building an Image there means reading
+the file and uploading a texture each time. The cache loads each file
+once and hands out the same Image afterwards, keyed by the file's path and
+modification time, so an icon replaced on disk is loaded again.
+
+Files are only checked for changes every TEXTURE_CACHE_CHECK_INTERVAL
+seconds. Once the images take more than TEXTURE_CACHE_BUDGET bytes, the
+least recently drawn ones are dropped, and their textures freed.
+
+The Image returned is shared: callers set its pos and size right before
+drawing it, as they did with their own.
+"""
+
+import os
+import time
+from threading import Lock
+
+from pymt import Image
+from config import TEXTURE_CACHE_BUDGET, TEXTURE_CACHE_CHECK_INTERVAL
+
+__all__ = ['TextureCache', 'texture_cache', 'get_image']
+
+BYTES_PER_PIXEL = 4
+
+
+class TextureCache(object):
+
+    def __init__(self, budget=TEXTURE_CACHE_BUDGET, check_interval=TEXTURE_CACHE_CHECK_INTERVAL, loader=Image):
+        self.budget = budget
+        self.check_interval = check_interval
+        self.loader = loader
+        self.lock = Lock()
+        self.entries = {}  # path -> [mtime, image or error, size, last use]
+        self.checked = {}  # path -> (mtime, time of the check)
+        self.size = 0
+        self.uses = 0
+
+    def get(self, path):
+        """ The Image of a file, loaded only if not cached or changed on disk.
+        A file that fails to load raises the same error until it changes. """
+        path = os.path.abspath(path)
+        self.lock.acquire()
+        try:
+            mtime = self.mtime(path)
+            self.uses += 1
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != mtime:
+                self.discard(path)
+                entry = self.load(path, mtime)
+            entry[3] = self.uses
+            self.evict(keep=path)
+        finally:
+            self.lock.release()
+        if isinstance(entry[1], Exception):
+            raise entry[1]
+        return entry[1]
+
+    def mtime(self, path):
+        mtime, checked = self.checked.get(path, (None, None))
+        now = time.time()
+        if checked is None or now - checked >= self.check_interval:
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                mtime = None
+            self.checked[path] = (mtime, now)
+        return mtime
+
+    def load(self, path, mtime):
+        try:
+            image = self.loader(path)
+            size = int(image.width * image.height * BYTES_PER_PIXEL)
+        except Exception, e: #Pokemon
+            image, size = e, 0
+        entry = [mtime, image, size, self.uses]
+        self.entries[path] = entry
+        self.size += size
+        return entry
+
+    def discard(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def evict(self, keep=None):
+        """ Drops the least recently used images until the cache fits its budget """
+        if self.size <= self.budget:
+            return
+        by_use = sorted(self.entries.items(), key=lambda item: item[1][3])
+        for path, entry in by_use:
+            if self.size <= self.budget:
+                break
+            if path != keep:
+                self.discard(path)
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.entries.clear()
+            self.checked.clear()
+            self.size = 0
+        finally:
+            self.lock.release()
+
+
+texture_cache = TextureCache()
+
+def get_image(path):
+    return texture_cache.get(path)
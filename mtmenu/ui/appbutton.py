@@ -3,6 +3,7 @@ from mtmenu.ui.apppopup import AppPopup
 from threading import Timer
 from config import APPSLIST_BTN_SIZE, APPSLIST_BTN_IMAGE_SIZE, APPSLIST_BTN_FONT_SIZE, APPSLIST_BTN_POPUPS_PER_BTN, APPSLIST_STAR_ONLY_WHEN_ORDER_BY_RATING
 from utils import get_trimmed_label_widget
+from texture_cache import get_image
 from mtmenu import logger
 
 class AppButton(MTKineticItem):
@@ -19,11 +20,26 @@ class AppButton(MTKineticItem):
         kwargs.setdefault('size', APPSLIST_BTN_SIZE)        
         
         self.app = app
-        self.popups_currently_open = 0
+        self.icon_path = app.get_icon_path()
+        self.popups = []  # AppPopups open for this button's application
         self.double_tap_detected = False
         
         super(AppButton, self).__init__(**kwargs)
         
+    def set_app(self, app):
+        """Shows another application, when the list recycles this button,
+        or a newer copy of its own. Only what changed is updated"""
+        if app.id != self.app.id:
+            # The popups were opened for the application shown before
+            for popup in list(self.popups):
+                popup.close()
+            self.double_tap_detected = False
+        if app.name != self.app.name:
+            self.label = unicode(app)
+        if app.icon.name != self.app.icon.name:
+            self.icon_path = app.get_icon_path()
+        self.app = app
+        
     """Execute application on double click
        Open popup on single click"""
     def on_press(self, touch):  
@@ -38,14 +54,17 @@ class AppButton(MTKineticItem):
     def open_popup(self, touch_pos):
         # If max number of popups allowed reached, don't open one more
         # If double click, don't open one more
-        if self.popups_currently_open == APPSLIST_BTN_POPUPS_PER_BTN or self.double_tap_detected:
+        if len(self.popups) >= APPSLIST_BTN_POPUPS_PER_BTN or self.double_tap_detected:
             return
         
-        self.popups_currently_open += 1
-        self.get_root_window().add_widget(AppPopup(self.app, touch_pos, self))
+        popup = AppPopup(self.app, touch_pos, self)
+        self.popups.append(popup)
+        self.get_root_window().add_widget(popup)
 
-    def popup_closed(self):
-        self.popups_currently_open -= 1
+    def popup_closed(self, popup):
+        # A popup can be closed by its timer and by a touch
+        if popup in self.popups:
+            self.popups.remove(popup)
 
     def open_app(self):
         logger.info('\nLoading %s...\n' % unicode(self.app))
@@ -55,9 +74,9 @@ class AppButton(MTKineticItem):
         self.app.execute()
 
         #refresh cstegory in main thread
-        from mtmenu import categories_list
+        from mtmenu import apps_list, categories_list
         categories_list.refresh()
-        self.parent.refresh(categories_list.current)
+        apps_list.refresh(categories_list.current)
         
         
     def draw(self): 
@@ -68,7 +87,7 @@ class AppButton(MTKineticItem):
         
         # Icon
         try:
-            image = Image( "../webmanager/media/%s" % str(self.app.icon) )
+            image = get_image(self.icon_path)
             x,y = list(self.center)
             image.size = self.get_resized_size(image)
             image.pos = x - image.width /2, y - image.height /2      
@@ -94,7 +113,7 @@ class AppButton(MTKineticItem):
             star_pos_x = self.pos[0] + self.size[0] - star_size[0]/3*2
             star_pos_y = self.pos[1] + self.size[1] - star_size[1]/3*2
             
-            image = Image("images/star.png")
+            image = get_image("images/star.png")
             image.pos = (star_pos_x, star_pos_y)
             image.draw()
             
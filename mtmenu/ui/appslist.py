@@ -1,68 +1,57 @@
 from pymt import *
 from appbutton import AppButton
+from kineticgrid import VirtualKineticGrid, PagedRows
 from config import APPSLIST_NUMBER_OF_LINES, APPSLIST_SIZE, APPSLIST_POSITION, APPSLIST_FRICTION, APPSLIST_PADDING_X, APPSLIST_PADDING_Y
+from config import APPSLIST_BTN_SIZE, APPSLIST_PREFETCH_COLUMNS, APPSLIST_PAGE_SIZE
 from utils import get_applications
 
-class AppsList(MTKineticList):
+class AppsList(VirtualKineticGrid):
     
-    """Widget to handle applications list"""
+    """Widget to handle applications list.
+    
+    Only the applications scrolled into view (and APPSLIST_PREFETCH_COLUMNS
+    columns around them) are read from the database and have an AppButton"""
 
     def __init__(self, applications, **kwargs):
-        kwargs.setdefault('title', None)
         kwargs.setdefault('size', APPSLIST_SIZE)
         kwargs.setdefault('pos', APPSLIST_POSITION)
-        kwargs.setdefault('deletable', False)
-        kwargs.setdefault('searchable', False)
-        kwargs.setdefault('do_x', True)
-        kwargs.setdefault('do_y', False)
-        kwargs.setdefault('h_limit', APPSLIST_NUMBER_OF_LINES)
-        kwargs.setdefault('w_limit',0)
-        kwargs.setdefault('font_size', 12)
+        kwargs.setdefault('rows', APPSLIST_NUMBER_OF_LINES)
+        kwargs.setdefault('item_size', APPSLIST_BTN_SIZE)
         kwargs.setdefault('padding_x', APPSLIST_PADDING_X)
         kwargs.setdefault('padding_y', APPSLIST_PADDING_Y)
         kwargs.setdefault('friction', APPSLIST_FRICTION)
-        kwargs.setdefault('style', {'bg-color':(0,0,0,0)})
-        super(AppsList, self).__init__(**kwargs)
+        kwargs.setdefault('prefetch', APPSLIST_PREFETCH_COLUMNS)
+        kwargs.setdefault('item_key', lambda app: app.id)
+        super(AppsList, self).__init__(AppButton, AppButton.set_app, **kwargs)
                
         self.apps = None
         self.current_category = None
         self.criteria = 'name'
         
-        for a in applications:
-            a.is_running = False
-            a.save(False, True)
+        # Single UPDATE, without signals, as ApplicationProxy.set_running
+        applications.update(is_running=False)
         self.add(applications)
         
         
-    def add(self, apps):
-        ''' add widgets to the applications list '''
+    def add(self, apps, keep_offset = False):
+        ''' show the applications of a queryset, read in pages as they are scrolled into view.
+        The buttons of the applications shown before and after are kept '''
         self.apps = apps
-        chunks = lambda lis, step:  map(lambda i: lis[i:i+step],  xrange(0, len(lis), step))
-
-        for chunk in chunks(self.apps, APPSLIST_NUMBER_OF_LINES):
-            chunk.reverse()
-            for app in chunk:
-                try:
-                    item = AppButton(app)
-                    self.add_widget(item)
-                except Exception as e:
-                    logger.error("Could not load application %s: %e" % (app, e))
+        self.set_source(PagedRows(apps, APPSLIST_PAGE_SIZE), keep_offset)
 
-            
     def refresh(self, category):
-        ''' replace the current list of the applications with the apps provided '''  
-        if category == self.current_category:
-            return            
+        ''' show the applications of a category, updating the list in place
+        (and keeping its scroll) if it is the current one '''  
+        same_category = category == self.current_category
         self.current_category = category
-        self.reorder()
+        self.reorder(keep_offset = same_category)
             
 
-    def reorder(self, sort_criteria = None):
+    def reorder(self, sort_criteria = None, keep_offset = False):
         if sort_criteria:
             self.criteria = sort_criteria
-        self.clear()
         self.apps = get_applications( self.current_category, self.criteria == 'value')
-        self.add( self.apps )
+        self.add( self.apps, keep_offset )
 
     def __call__(self):
         return self
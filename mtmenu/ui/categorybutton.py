@@ -18,6 +18,12 @@ class CategoryButton(MTKineticItem):
         
         super(CategoryButton, self).__init__(**kwargs)
 
+    def set_category(self, cat):
+        """Shows a newer copy of its category"""
+        if cat.name != self.category.name:
+            self.label = cat.name
+        self.category = cat
+
     def on_press(self, touch):
         from mtmenu import apps_list
         apps_list.refresh(self.category)
@@ -40,14 +40,43 @@ class CategoryList (MTKineticList):
         self.select_category(category_to_select)
        
     def refresh(self):
-        self.clear()
-        self.add(get_all_categories(), self.current)
-        if not self.is_current_valid():
+        ''' Updates the buttons to the categories on database, keyed by id.
+        Renamed categories only get a new label, and the buttons before the
+        first one added, removed or moved are left in place '''
+        self.categories = list(get_all_categories())
+        categories = dict([(self.key(category), category) for category in self.categories])
+        
+        buttons = dict([(self.key(button.category), button) for button in self.children])
+        for key, category in categories.items():
+            if key in buttons:
+                buttons[key].set_category(category)
+        
+        # 'All' is always the last one
+        wanted = [self.key(category) for category in self.categories] + [None]
+        shown = [self.key(button.category) for button in self.children]
+        if wanted != shown:
+            first_change = 0
+            while first_change < min(len(wanted), len(shown)) and wanted[first_change] == shown[first_change]:
+                first_change += 1
+            for button in list(self.children)[first_change:]:
+                self.remove_widget(button)
+            for key in wanted[first_change:]:
+                self.add_widget(buttons.get(key) or CategoryButton(categories.get(key)))
+        
+        current = categories.get(self.key(self.current))
+        current_removed = self.current is not None and current is None
+        self.select_category(current)
+        if current_removed:
             from mtmenu import apps_list
             apps_list.refresh(None)
+
+    @staticmethod
+    def key(category):
+        return category and category.id
             
     def select_category(self, category_to_select = None):
         self.current = category_to_select
+        one_selected = False
         
         for cat_button in self.children:
             if cat_button.category == self.current:
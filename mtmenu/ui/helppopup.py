@@ -1,5 +1,6 @@
 from pymt import *
 from config import HELPPOPUP_POSITION, HELPPOPUP_SIZE, MAINWINDOW_SIZE
+from texture_cache import get_image
 
 class HelpPopup(MTModalWindow):
 
@@ -53,12 +54,12 @@ class HelpPopup(MTModalWindow):
                   autoheight = False)
         
         # SenseBloom logo
-        image = Image("images/sensebloom.png")
+        image = get_image("images/sensebloom.png")
         image.pos = x + 150, y+self.size[1]-185  
         image.draw()
         
         # SenseBloom logo
-        image = Image("images/dei.png")
+        image = get_image("images/dei.png")
         image.pos = x + 410, y+self.size[1]-185  
         image.draw()
         
@@ -106,7 +107,7 @@ class HelpPopup(MTModalWindow):
                   autoheight = False)
         
         # Application's tooltip Image
-        image = Image("images/app_tooltip.png")
+        image = get_image("images/app_tooltip.png")
         image.pos = text_pos_x+65, y+60
         image.draw()
         
@@ -129,7 +130,7 @@ class HelpPopup(MTModalWindow):
                   autoheight = False)
         
         # Exit gesture Image
-        image = Image("images/exit_gesture.png")
+        image = get_image("images/exit_gesture.png")
         image.pos = text_pos_x + (text_size_x/2+40), y+25 
         image.draw()
         
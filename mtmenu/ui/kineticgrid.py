@@ -0,0 +1,214 @@
+from pymt import *
+from mtmenu import logger
+
+# Touches that move less than this (in pixels) are taps on an item, not scrolls
+TAP_DISTANCE = 20
+
+
+class PagedRows(object):
+    """A queryset read in pages of page_size rows, each one when first needed.
+
+    The number of rows is counted once; use a new PagedRows to see changes."""
+
+    def __init__(self, queryset, page_size):
+        self.queryset = queryset
+        self.page_size = page_size
+        self.pages = {}
+        self.count = None
+
+    def __len__(self):
+        if self.count is None:
+            self.count = self.queryset.count()
+        return self.count
+
+    def __getitem__(self, index):
+        page = index / self.page_size
+        if page not in self.pages:
+            start = page * self.page_size
+            self.pages[page] = list(self.queryset[start:start + self.page_size])
+        return self.pages[page][index - page * self.page_size]
+
+
+class VirtualKineticGrid(MTStencilContainer):
+    """Kinetic list of items in columns of `rows`, scrolling along x, that
+    only has widgets for the columns on screen.
+
+    Arguments:
+        create_item -- Called as create_item(item), returns a new widget showing item
+        update_item -- Called as update_item(widget, item) to make a widget show
+                       item: another one, or a newer copy of its own
+        item_key -- What identifies an item across sources (default: the item)
+        rows -- Items per column
+        item_size -- Size of the widget of each item
+        padding_x, padding_y -- Space between columns and rows
+        friction -- How fast the list stops after being thrown
+        prefetch -- Columns on each side of the screen that have widgets too
+
+    Items come from source, anything with len() and indexing (e.g. PagedRows),
+    and are read only when their column is about to be shown. The widgets of
+    the columns that scroll out of view are given the items of the ones that
+    scroll in, so drawing and hit-testing don't depend on the number of items.
+
+    When the items change, the widgets of the items still in view are kept
+    (matched by item_key()) and moved to their new place; only the items
+    new to the view take a widget."""
+
+    def __init__(self, create_item, update_item, **kwargs):
+        self.create_item = create_item
+        self.update_item = update_item
+        self.item_key = kwargs.pop('item_key', lambda item: item)
+        self.rows = kwargs.pop('rows', 1)
+        self.item_size = kwargs.pop('item_size', (100, 100))
+        self.padding_x = kwargs.pop('padding_x', 0)
+        self.padding_y = kwargs.pop('padding_y', 0)
+        self.friction = kwargs.pop('friction', 5)
+        self.prefetch = kwargs.pop('prefetch', 1)
+        super(VirtualKineticGrid, self).__init__(**kwargs)
+
+        self.source = []
+        self.offset = 0
+        self.vx = 0
+        self.touches = {}
+        self.visible = {}
+        self.keys = {}
+        self.spare = []
+
+    def set_source(self, source, keep_offset=False):
+        """Shows other items, scrolled back to the first one unless keep_offset.
+
+        The widgets of items in view before and after are kept, and given
+        their item from the new source; the others are spare."""
+        kept = {}
+        for index, widget in self.visible.items():
+            kept[self.keys[index]] = widget
+        self.visible = {}
+        self.keys = {}
+        self.source = source
+        if not keep_offset:
+            self.offset = 0
+            self.vx = 0
+        self.scroll_by(0)
+
+        start, stop = self.visible_range()
+        for index in xrange(start, stop):
+            if not kept:
+                break
+            try:
+                item = self.source[index]
+            except Exception, e: #Pokemon
+                logger.error("Could not load item %s: %s" % (index, e))
+                continue
+            key = self.item_key(item)
+            widget = kept.pop(key, None)
+            if widget is None:
+                continue
+            try:
+                self.update_item(widget, item)
+            except Exception, e: #Pokemon
+                logger.error("Could not load item %s: %s" % (index, e))
+                kept[key] = widget
+                continue
+            self.visible[index] = widget
+            self.keys[index] = key
+
+        for widget in kept.values():
+            self.remove_widget(widget)
+            self.spare.append(widget)
+        self.layout()
+
+    def column_width(self):
+        return self.item_size[0] + self.padding_x
+
+    def min_offset(self):
+        columns = (len(self.source) + self.rows - 1) / self.rows
+        return min(0, self.width - columns * self.column_width())
+
+    def scroll_by(self, dx):
+        self.offset = max(self.min_offset(), min(0, self.offset + dx))
+
+    def on_draw(self):
+        dt = getFrameDt()
+        if self.vx and not self.touches:
+            self.scroll_by(self.vx * dt)
+            self.vx /= 1 + (self.friction * dt)
+            if abs(self.vx) < 1:
+                self.vx = 0
+        self.layout()
+        super(VirtualKineticGrid, self).on_draw()
+
+    def visible_range(self):
+        """Indexes of the items in view and in the prefetch margin"""
+        column_width = self.column_width()
+        first = max(0, int(-self.offset / column_width) - self.prefetch)
+        last = int((-self.offset + self.width) / column_width) + 1 + self.prefetch
+        return first * self.rows, min(len(self.source), last * self.rows)
+
+    def layout(self):
+        start, stop = self.visible_range()
+        for index in self.visible.keys():
+            if not start <= index < stop:
+                self.release(index)
+
+        row_height = self.item_size[1] + self.padding_y
+        for index in xrange(start, stop):
+            widget = self.visible.get(index)
+            if widget is None:
+                widget = self.acquire(index)
+                if widget is None:
+                    continue
+            column, row = divmod(index, self.rows)
+            widget.pos = (self.x + self.padding_x / 2 + column * self.column_width() + self.offset,
+                          self.y + self.height - (row + 1) * row_height + self.padding_y / 2)
+
+    def acquire(self, index):
+        """Shows an item on a spare widget, or a new one"""
+        try:
+            item = self.source[index]
+            if self.spare:
+                widget = self.spare.pop()
+                self.update_item(widget, item)
+            else:
+                widget = self.create_item(item)
+        except Exception, e: #Pokemon
+            logger.error("Could not load item %s: %s" % (index, e))
+            return None
+        self.visible[index] = widget
+        self.keys[index] = self.item_key(item)
+        self.add_widget(widget)
+        return widget
+
+    def release(self, index):
+        widget = self.visible.pop(index)
+        del self.keys[index]
+        self.remove_widget(widget)
+        self.spare.append(widget)
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(touch.x, touch.y):
+            return False
+        touch.grab(self)
+        self.touches[touch.id] = [touch.x, touch.x]
+        self.vx = 0
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current != self:
+            return False
+        start, last = self.touches[touch.id]
+        self.scroll_by(touch.x - last)
+        self.vx = (touch.x - last) / max(getFrameDt(), 0.001)
+        self.touches[touch.id][1] = touch.x
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current != self:
+            return False
+        touch.ungrab(self)
+        start, last = self.touches.pop(touch.id)
+        if abs(touch.x - start) < TAP_DISTANCE:
+            self.vx = 0
+            for widget in self.visible.values():
+                if widget.collide_point(touch.x, touch.y):
+                    widget.dispatch_event('on_press', touch)
+                    break
+        return True
@@ -1,6 +1,7 @@
 from pymt import *
 from config import TOPBAR_SIZE, TOPBAR_POSITION
 from ui.helpbutton import HelpButton
+from texture_cache import get_image
 
 class TopBar(MTWidget):
     
@@ -39,7 +40,7 @@ class TopBar(MTWidget):
                              corners=(True,True,False,False))
         
         # Logo
-        image = Image("images/logo.png")
+        image = get_image("images/logo.png")
         image.pos = x + 30, y + 12     
         image.draw()
         
@@ -70,13 +71,13 @@ class TopBar(MTWidget):
             vote_image = "images/order_by_rating_selected.png"
         
         # Order by Name button
-        image = Image(name_image)
+        image = get_image(name_image)
         self.name_pos = (x-470, y-110)
         image.pos = self.name_pos 
         image.draw()
         
         # Order by Votes button
-        image = Image(vote_image)
+        image = get_image(vote_image)
         self.votes_pos = (x-318, y-110)
         image.pos = self.votes_pos   
         image.draw()
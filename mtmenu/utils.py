@@ -9,6 +9,7 @@ from models import *
 from window_manager import *
 from config import MAX_ATTEMPTS, SLEEP_SECONDS_BETWEEN_ATTEMPTS, NATIVE_APP_NAMES, PRODUCTION
 from mtmenu import logger
+from mtmenu.text_fitting import text_fitter
 
 
 
@@ -37,7 +38,8 @@ def exists_category(category_name):
 
 def sort_apps(apps, sort_by_value):
     if sort_by_value:
-        return sorted(list(apps), key = lambda app: app.value(), reverse= True)
+        # rating is stored and indexed, so the database does the sorting
+        return apps.order_by('-rating', 'name')
     else:
         return apps.order_by('name')
     
@@ -86,25 +88,7 @@ def get_trimmed_label_widget(text, position, font_size, max_width):
     """ Constructs an MTLabel with a max_width. If needed label text is trimmed 
     and '...' is added for the user to known that more text exists.
     
-    Return: list(label_object, label_text_after_trim) """
-    
-    text_changed = False
-    label_obj = MTLabel(label = text,
-                        pos = position,
-                        font_size = font_size,
-                        autowidth = True)
+    The label is built once and reused afterwards (see text_fitting).
     
-    while label_obj.width > max_width:
-    
-        text = text[:-1]
-        
-        text_changed = True
-        label_obj = MTLabel(label = "%s..." % text,
-                            pos = position,
-                            font_size = font_size,
-                            autowidth = True)
-    
-    if text_changed:
-        text = "%s..." % text
-    
-    return (label_obj, text)
+    Return: list(label_object, label_text_after_trim) """
+    return text_fitter.fit(text, position, font_size, max_width)
@@ -0,0 +1,252 @@
+"""
+Write-behind buffer for the statistics and logs produced by the wall.
+
+Runs, votes and application logs are kept in memory and written to the
+database in a single transaction every WRITEBEHIND_INTERVAL seconds and on
+shutdown, so the thread that brings the menu back never waits on the
+database. The running flag isn't buffered: the web manager relies on it to
+keep running applications from being changed, so it is written right away
+(see ApplicationProxy.set_running).
+
+Every change is also appended to a journal file before it is buffered. The
+journal is moved aside while a batch is being written and deleted once the
+transaction commits, so whatever is still there when the menu starts again
+after a crash is replayed.
+
+Each journal starts with a batch id, and the ids of the journals a batch
+was made of are stored in the same transaction as the batch. A journal
+whose batch was written, but which the crash left behind, is not replayed.
+"""
+
+import os
+import uuid
+from datetime import datetime
+from threading import Lock, Timer
+
+from django.db import transaction
+from django.utils import simplejson
+
+from config import WRITEBEHIND_JOURNAL, WRITEBEHIND_INTERVAL, WRITEBEHIND_BATCHES_KEPT
+from mtmenu import logger
+from webmanager.appman.models import Application, WriteBehindBatch, COUNTER_FIELDS, increment_counters
+
+__all__ = ['WriteBehindBuffer', 'write_behind']
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class WriteBehindBuffer(object):
+
+    def __init__(self, journal=WRITEBEHIND_JOURNAL, interval=WRITEBEHIND_INTERVAL):
+        self.journal = journal
+        self.flushing = journal + '.flushing'
+        self.interval = interval
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.timer = None
+        self.counters = {}
+        self.logs = []
+
+    def add_run(self, app_id):
+        self.record({'app': app_id, 'runs': 1})
+
+    def vote(self, app_id, like):
+        if like:
+            self.record({'app': app_id, 'likes': 1})
+        else:
+            self.record({'app': app_id, 'dislikes': 1})
+
+    def add_log(self, app_id, text):
+        self.record({'app': app_id, 'log': text, 'datetime': datetime.now().strftime(DATETIME_FORMAT)})
+
+    def record(self, entry):
+        """ Journals an entry and adds it to the next batch """
+        self.lock.acquire()
+        try:
+            new_journal = not os.path.exists(self.journal)
+            journal = open(self.journal, 'a')
+            try:
+                if new_journal:
+                    journal.write(simplejson.dumps({'batch': uuid.uuid4().hex}) + '\n')
+                journal.write(simplejson.dumps(entry) + '\n')
+            finally:
+                journal.close()
+            self.buffer(entry)
+        finally:
+            self.lock.release()
+
+    def buffer(self, entry):
+        if 'batch' in entry:
+            return
+        app_id = entry['app']
+        if 'log' in entry:
+            when = datetime.strptime(entry['datetime'], DATETIME_FORMAT)
+            self.logs.append((app_id, when, entry['log']))
+        elif 'running' in entry:
+            # Journaled by older versions. Replaying it would flag an application
+            # as running after the menu cleared the flags at startup
+            return
+        else:
+            deltas = self.counters.setdefault(app_id, {})
+            for field in COUNTER_FIELDS:
+                if field in entry:
+                    deltas[field] = deltas.get(field, 0) + entry[field]
+
+    def pending(self):
+        """ Number of entries waiting to be written """
+        return len(self.counters) + len(self.logs)
+
+    def flush(self):
+        """ Writes the buffered entries in one transaction. Returns False if it failed. """
+        self.flush_lock.acquire()
+        try:
+            self.lock.acquire()
+            try:
+                counters, logs = self.counters, self.logs
+                self.counters, self.logs = {}, []
+                self.rotate_journal()
+                batches = self.batches(self.flushing)
+            finally:
+                self.lock.release()
+
+            if not (counters or logs):
+                if os.path.exists(self.flushing):
+                    os.remove(self.flushing)
+                return True
+            try:
+                self.write(counters, logs, batches)
+            except Exception, e: #Pokemon
+                logger.error("EXCEPTION WRITING STATISTICS, WILL RETRY:\n%s" % e)
+                self.lock.acquire()
+                try:
+                    self.requeue(counters, logs)
+                finally:
+                    self.lock.release()
+                return False
+            os.remove(self.flushing)
+            return True
+        finally:
+            self.flush_lock.release()
+
+    def rotate_journal(self):
+        """ Moves the journal aside, appending it to entries of a batch that failed to be written """
+        if not os.path.exists(self.journal):
+            return
+        if not os.path.exists(self.flushing):
+            os.rename(self.journal, self.flushing)
+            return
+        flushing = open(self.flushing, 'a')
+        try:
+            journal = open(self.journal)
+            try:
+                flushing.write(journal.read())
+            finally:
+                journal.close()
+        finally:
+            flushing.close()
+        os.remove(self.journal)
+
+    def batches(self, path):
+        """ The batch ids of the journals in a file """
+        if not os.path.exists(path):
+            return []
+        batches = []
+        journal = open(path)
+        try:
+            for line in journal:
+                if line.startswith('{"batch"'):
+                    try:
+                        batches.append(simplejson.loads(line)['batch'])
+                    except ValueError:
+                        pass
+        finally:
+            journal.close()
+        return batches
+
+    def requeue(self, counters, logs):
+        """ Puts back a batch that could not be written, before anything buffered since """
+        for app_id, deltas in counters.items():
+            for field, delta in deltas.items():
+                self.buffer({'app': app_id, field: delta})
+        self.logs = logs + self.logs
+
+    @transaction.commit_on_success
+    def write(self, counters, logs, batches=()):
+        from models import ApplicationLogProxy
+
+        # Entries of applications deleted in the meantime are dropped
+        app_ids = set(counters.keys()) | set([log[0] for log in logs])
+        existing = set(Application.objects.filter(id__in=app_ids).values_list('id', flat=True))
+
+        for app_id, deltas in counters.items():
+            if app_id in existing and deltas:
+                increment_counters(app_id, **dict([(str(field), delta) for field, delta in deltas.items()]))
+        for app_id, when, text in logs:
+            if app_id in existing:
+                log = ApplicationLogProxy.objects.create(application_id=app_id, error_description=text)
+                # datetime is auto_now_add, so the time the entry was recorded is set afterwards
+                ApplicationLogProxy.objects.filter(id=log.id).update(datetime=when)
+
+        written = set(WriteBehindBatch.objects.filter(batch__in=batches).values_list('batch', flat=True))
+        for batch in batches:
+            if batch not in written:
+                last = WriteBehindBatch.objects.create(batch=batch)
+                WriteBehindBatch.objects.filter(id__lte=last.id - WRITEBEHIND_BATCHES_KEPT).delete()
+
+    def recover(self):
+        """ Buffers the journaled entries a previous run didn't write.
+        Journals whose batch was written before the crash are skipped. """
+        self.lock.acquire()
+        try:
+            paths = [path for path in (self.flushing, self.journal) if os.path.exists(path)]
+            batches = []
+            for path in paths:
+                batches.extend(self.batches(path))
+            written = set(WriteBehindBatch.objects.filter(batch__in=batches).values_list('batch', flat=True))
+
+            for path in paths:
+                skipping = False
+                journal = open(path)
+                try:
+                    for line in journal:
+                        try:
+                            entry = simplejson.loads(line)
+                        except ValueError:
+                            # A line cut short by the crash
+                            logger.error("Skipping damaged journal entry: %r" % line)
+                            continue
+                        if 'batch' in entry:
+                            skipping = entry['batch'] in written
+                        elif not skipping:
+                            self.buffer(entry)
+                finally:
+                    journal.close()
+        finally:
+            self.lock.release()
+        if self.pending():
+            logger.info("Recovered %s unwritten statistics entries" % self.pending())
+
+    def start(self):
+        """ Recovers from a previous run and starts flushing periodically """
+        self.recover()
+        self.flush()
+        self.schedule()
+
+    def schedule(self):
+        self.timer = Timer(self.interval, self.tick)
+        self.timer.setDaemon(True)
+        self.timer.start()
+
+    def tick(self):
+        self.flush()
+        self.schedule()
+
+    def stop(self):
+        """ Stops the timer and writes whatever is left """
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        self.flush()
+
+
+write_behind = WriteBehindBuffer()
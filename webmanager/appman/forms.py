@@ -39,6 +39,8 @@ class DocumentationForm(ModelForm):
         fields = ('title','content')
         
 class ProjectorControlForm(ModelForm):
+    force = BooleanField(required=False, label="Write every day",
+                         help_text="Also write the days that look unchanged, e.g. after a projector was set by hand.")
 
     def clean(self):
         cleaned_data = self.cleaned_data
@@ -0,0 +1,38 @@
+import os
+import timeit
+from cStringIO import StringIO
+
+from django.core.management.base import BaseCommand
+
+from appman.utils.fileutils import relative
+from appman.utils.projectors import parse_power, parse_status, read_until, POWER_FIELD
+
+PAGES = relative('../../tests/projector_pages')
+
+def replace_and_scan(page):
+    """ How the power state used to be found, for comparison. """
+    dic = {0:"OFF" , 1:"ON", 2:"COOL_DOWN"}
+    status = lambda n: 'Power Status</th><td nowrap class="item_oparation_area"><script language="JavaScript"><!--sts = "%s";' % (str(n))
+    clean_page = page.replace("\n",'').replace("\t",'').replace("\r",'')
+    for i in range(3):
+        if status(i) in clean_page:
+            return dic[i]
+    return "REQUEST_ERROR"
+
+class Command(BaseCommand):
+    args = "[number of runs]"
+    help = ("Times the parsing of the projector status pages in tests/projector_pages. "
+            "They are synthetic, laid out like the projectors' pages; add pages saved "
+            "from a real projector there to time those.")
+
+    def handle(self, *args, **options):
+        number = args and int(args[0]) or 10000
+        for name in sorted(os.listdir(PAGES)):
+            page = open(os.path.join(PAGES, name), 'rb').read()
+            print "%s (%d bytes): %s" % (name, len(page), parse_status(page))
+            for label, fun in [('replace and scan', lambda: replace_and_scan(page)),
+                               ('power pattern', lambda: parse_power(page)),
+                               ('power pattern, streamed', lambda: read_until(StringIO(page), POWER_FIELD)),
+                               ('whole status', lambda: parse_status(page))]:
+                seconds = timeit.Timer(fun).timeit(number)
+                print "  %-24s %8.1f us" % (label, seconds / number * 1e6)
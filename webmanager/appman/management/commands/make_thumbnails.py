@@ -0,0 +1,16 @@
+from django.core.management.base import NoArgsCommand
+
+from appman.models import Application
+from appman.utils.thumbnails import make_thumbnails
+
+class Command(NoArgsCommand):
+    help = "Generates the icon thumbnails shown on the wall, for icons uploaded before them."
+
+    def handle_noargs(self, **options):
+        for app_id, icon in Application.objects.values_list('id', 'icon'):
+            if not icon:
+                continue
+            try:
+                make_thumbnails(icon)
+            except Exception, e:
+                print "Application %s: %s" % (app_id, e)
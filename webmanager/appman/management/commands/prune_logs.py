@@ -0,0 +1,9 @@
+from django.core.management.base import NoArgsCommand
+
+from appman.utils.log_retention import prune_all_logs
+
+class Command(NoArgsCommand):
+    help = "Deletes the application logs that are beyond the retention limits."
+
+    def handle_noargs(self, **options):
+        print "Deleted %s logs." % prune_all_logs()
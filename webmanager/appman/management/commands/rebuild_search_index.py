@@ -0,0 +1,9 @@
+from django.core.management.base import NoArgsCommand
+
+from appman.utils.search import rebuild_index
+
+class Command(NoArgsCommand):
+    help = "Rebuilds the search index of every application."
+
+    def handle_noargs(self, **options):
+        rebuild_index()
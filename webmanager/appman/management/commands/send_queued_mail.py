@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+
+from appman.utils.outbox import send_pending, outbox_depth
+
+class Command(NoArgsCommand):
+    help = "Sends the e-mail messages that are due, e.g. after a restart."
+
+    def handle_noargs(self, **options):
+        while send_pending() == settings.OUTBOX_BATCH_SIZE:
+            pass
+        print "%s messages left in the outbox." % outbox_depth()
@@ -0,0 +1,10 @@
+from django.core.management.base import NoArgsCommand
+
+from appman.models import Application, wilson_lower_bound
+
+class Command(NoArgsCommand):
+    help = "Recomputes the stored rating of every application from its votes."
+
+    def handle_noargs(self, **options):
+        for app_id, likes, dislikes in Application.objects.values_list('id', 'likes', 'dislikes'):
+            Application.objects.filter(id=app_id).update(rating=wilson_lower_bound(likes, dislikes))
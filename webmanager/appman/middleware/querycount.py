@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db import connection
+
+class QueryCountMiddleware(object):
+    """ Adds the number of SQL queries a request made as an X-Query-Count header.
+
+    Queries are only recorded by Django when DEBUG is on, so the header is
+    only set then. The tests use it to catch views whose query count grows
+    with the number of rows they show. """
+
+    def process_request(self, request):
+        request._queries_before = len(connection.queries)
+
+    def process_response(self, request, response):
+        if settings.DEBUG and hasattr(request, '_queries_before'):
+            response['X-Query-Count'] = str(len(connection.queries) - request._queries_before)
+        return response
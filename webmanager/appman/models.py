@@ -1,7 +1,10 @@
 import datetime
+import math
 
 from django.db import models
+from django.db.models import F
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth.models import User
 
 class Category(models.Model):
@@ -14,6 +17,10 @@ class Category(models.Model):
     def __unicode__(self):
         return u"%s" % self.name
 
+    def save(self, *args, **kwargs):
+        super(Category,self).save(*args, **kwargs)
+        cache.delete(CATEGORIES_CACHE_KEY)
+
     def delete(self):
         """ Deletes a category and moves apps to Default Category."""
         if self.name == settings.DEFAULT_CATEGORY:
@@ -23,7 +30,47 @@ class Category(models.Model):
         Application.objects.filter(category=self.id).update(category=defcat)
 
         super(Category,self).delete();
+        cache.delete(CATEGORIES_CACHE_KEY)
+
+CATEGORIES_CACHE_KEY = 'appman.categories'
+
+def get_categories():
+    """ All categories, cached between requests as they seldom change. """
+    categories = cache.get(CATEGORIES_CACHE_KEY)
+    if categories is None:
+        categories = list(Category.objects.all())
+        cache.set(CATEGORIES_CACHE_KEY, categories, settings.CATEGORIES_CACHE_TIMEOUT)
+    return categories
         
+def wilson_lower_bound(positive, negative, z=1.96):
+    """ Lower bound of the Wilson score interval of the ratio of positive votes.
+
+    Unlike the plain ratio, an application with 1 like out of 1 vote ranks
+    below one with 90 likes out of 100. z=1.96 gives 95% confidence. """
+    n = positive + negative
+    if n == 0:
+        return 0.0
+    p = positive / float(n)
+    return (p + z*z/(2*n) - z * math.sqrt((p*(1-p) + z*z/(4*n)) / n)) / (1 + z*z/n)
+
+COUNTER_FIELDS = ('likes', 'dislikes', 'runs')
+
+def increment_counters(app_id, **deltas):
+    """ Atomically adds deltas to the counters of an application and updates its rating.
+
+    Returns the new (likes, dislikes, runs). The rating is only written if
+    the votes it was computed from are still current: otherwise a later
+    increment has changed them and will write its own. """
+    for field in deltas:
+        if field not in COUNTER_FIELDS:
+            raise ValueError("%s is not a counter" % field)
+    apps = Application.objects.filter(pk=app_id)
+    apps.update(**dict([(str(field), F(field) + delta) for field, delta in deltas.items()]))
+    likes, dislikes, runs = apps.values_list(*COUNTER_FIELDS)[0]
+    if 'likes' in deltas or 'dislikes' in deltas:
+        apps.filter(likes=likes, dislikes=dislikes).update(rating=wilson_lower_bound(likes, dislikes))
+    return likes, dislikes, runs
+
 class Application(models.Model):
     name = models.CharField(max_length=50, unique=True)
     owner = models.ForeignKey(User)
@@ -36,10 +83,13 @@ class Application(models.Model):
     runs = models.IntegerField(default=0)
     likes = models.IntegerField(default=0)
     dislikes = models.IntegerField(default=0)
+    rating = models.FloatField(default=0, db_index=True, editable=False) # wilson_lower_bound(likes, dislikes)
     
     zipfile = models.FileField(upload_to=settings.ZIP_FOLDER)
     icon = models.ImageField(upload_to='icons')
     is_extracted = models.BooleanField(default=False)
+    zipfile_hash = models.CharField(max_length=40, blank=True, editable=False) # SHA-1 of the deployed zipfile
+    zipfile_size = models.IntegerField(default=0, editable=False)
     is_running = models.BooleanField(default=False)
     
     def value(self):
@@ -53,9 +103,20 @@ class Application(models.Model):
     def stars(self):
         """ The number of stars an application has, based on the likes and dislikes """
         return round(self.value()*5)
+
+    def update_rating(self):
+        self.rating = wilson_lower_bound(self.likes, self.dislikes)
+
+    def increment(self, **deltas):
+        """ Adds deltas to counters, e.g. increment(likes=1), with a single UPDATE.
+
+        Unlike save(), concurrent increments are never lost, and no signals
+        are sent, so votes and runs don't trigger a redeploy. """
+        self.likes, self.dislikes, self.runs = increment_counters(self.pk, **deltas)
+        self.update_rating()
             
     class Meta:
-        ordering = ("-likes",)
+        ordering = ("-rating", "name")
     
     def __unicode__(self):
         return u"%s" % self.name
@@ -64,6 +125,8 @@ class Application(models.Model):
         try:
             old_obj = Application.objects.get(pk=self.pk)
             if old_obj.icon.path != self.icon.path:
+                    from appman.utils.thumbnails import delete_thumbnails
+                    delete_thumbnails(old_obj.icon.name)
                     old_obj.icon.delete()
         except:
             pass
@@ -75,6 +138,7 @@ class Application(models.Model):
         except:
             pass
         
+        self.update_rating()
         super(Application, self).save(force_insert, force_update)
 
     @models.permalink
@@ -121,3 +185,40 @@ class WallManager(models.Model):
         """ There can be only one WallManager instance."""
         WallManager.objects.all().delete()
         super(WallManager,self).save(*args, **kwargs)
+
+class SearchTerm(models.Model):
+    """ Inverted index entry of the application search (see appman.utils.search). """
+    term = models.CharField(max_length=50, db_index=True)
+    application = models.ForeignKey(Application)
+    weight = models.IntegerField(default=1)
+    
+    def __unicode__(self):
+        return u"%s -> %s" % (self.term, self.application_id)
+
+class OutgoingEmail(models.Model):
+    """ An e-mail message waiting to be sent by the background sender (see appman.utils.outbox). """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.TextField() # comma separated
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=datetime.datetime.now, db_index=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['next_attempt', 'id']
+
+    def __unicode__(self):
+        return u"%s to %s" % (self.subject, self.recipients)
+
+class WriteBehindBatch(models.Model):
+    """ A batch of statistics written by the wall's write-behind buffer (see mtmenu.writebehind).
+
+    Recorded in the same transaction as the batch, so a journal replayed
+    after a crash doesn't count it twice. """
+    batch = models.CharField(max_length=32, unique=True)
+    written = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        return self.batch
@@ -1,20 +1,24 @@
 import os
 from shutil import rmtree
-from smtplib import SMTPException
 
 from django.db.models import signals
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.dispatch import dispatcher, Signal
-from django.core.mail import send_mail
 
 from appman.models import Application, ApplicationLog, WallManager
 from appman.models import Application, WallManager
 
-from appman.models import Application, ApplicationLog, WallManager
-from appman.utils.unzip import unzip
+from appman.models import Application, ApplicationLog, WallManager, Category
 from appman.utils.uncompress import UncompressThread
+from appman.utils.deploy import deployment_queue
+from appman.utils.extract import manifest_path
+from appman.utils.fileutils import delete_path
+from appman.utils.search import index_application, rebuild_index
 from appman.utils.log_file import logger
+from appman.utils.log_retention import prune_logs
+from appman.utils.outbox import queue_mail
+from appman.utils.thumbnails import make_thumbnails, delete_thumbnails
 from appman.utils import get_contact_admin_email
 
 #Custom signal declarations
@@ -43,7 +47,7 @@ def remove_file(file, save=True):
 # Signals    
 
 def uncompress_file(sender, instance, signal, *args, **kwargs):
-    """ Deletes the previous version and starts the uncompressing of the file """
+    """ Queues the deployment of the file, which replaces the previous version """
     application_was_added = kwargs['created']
     if application_was_added:
         logger.log_app_event(instance, 'added')
@@ -51,21 +55,35 @@ def uncompress_file(sender, instance, signal, *args, **kwargs):
         logger.log_app_event(instance, 'edited')
     
     path = get_app_dir(instance)
-    remove_dir(path)
     if instance.zipfile:
-        from appman.utils.uncompress import UncompressThread
-        UncompressThread(sender,instance, path, extracted_email_signal).start()
+        deployment_queue.submit(UncompressThread(sender, instance, path, extracted_email_signal))
+    else:
+        remove_dir(path)
     
 def remove_app(sender, instance, signal, *args, **kwargs):
     """ Deletes the uncompressed folder """
     logger.log_app_event(instance, 'deleted')
+    deployment_queue.forget(instance.id)
     
-    if instance.is_extracted and not instance.is_running:
+    # Not only if is_extracted: a deployment may have been swapped in just before it was cancelled
+    if not instance.is_running:
         remove_dir(get_app_dir(instance))
+        delete_path(manifest_path(get_app_dir(instance)))
     remove_file(instance.zipfile, False)
+    if instance.icon:
+        delete_thumbnails(instance.icon.name)
     remove_file(instance.icon, False)
     logger.log_app_event(instance, 'removed from filesystem')
 
+def make_icon_thumbnails(sender, instance, signal, *args, **kwargs):
+    """ Generates the thumbnails the wall shows instead of the uploaded icon """
+    if not instance.icon:
+        return
+    try:
+        make_thumbnails(instance.icon.name)
+    except Exception, e: #Pokemon
+        logger.log_app_event(instance, 'icon thumbnails failed: %s' % e)
+
 def send_mail_when_app_available(sender, **kwargs):
     """ Sends an e-mail message informing the user that the application is ready to be used """
     if 'success' in kwargs:
@@ -85,18 +103,28 @@ def send_mail_when_app_available(sender, **kwargs):
         Please check if the zipfile is valid, contains a boot.bat \n
         and follows the technical guidelines.""" % application.name
         subject = '[WallManager] Error deploying application.'
-    try: 
-        send_mail(subject, message, email_from, [email_to])
-    except SMTPException:
-        application.owner.message_set.create(message = message)
+    # Also shown on the site, as the e-mail may be late or never arrive
+    application.owner.message_set.create(message = message)
+    queue_mail(subject, message, email_from, [email_to])
         
     
 def remove_extra_logs(sender, **kwargs):
-    """ Removes logs after a certain limit by Application. """
-    app = kwargs['instance'].application
-    for log in ApplicationLog.objects.filter(application=app).order_by('-datetime')[settings.APPS_MAX_LOG_ENTRIES:]:
-        log.delete()
+    """ Removes the logs of the Application that are beyond the retention limits. """
+    prune_logs(kwargs['instance'].application_id)
     
+def update_search_index(sender, instance, signal, *args, **kwargs):
+    """ Reindexes the applications whose searchable text may have changed """
+    if isinstance(instance, Application):
+        index_application(instance)
+    elif isinstance(instance, Category):
+        rebuild_index(Application.objects.filter(category=instance))
+    elif isinstance(instance, User):
+        rebuild_index(Application.objects.filter(owner=instance))
+
+def reindex_default_category(sender, instance, signal, *args, **kwargs):
+    """ Apps of a deleted category are moved to the default one without signals """
+    rebuild_index(Application.objects.filter(category__name=settings.DEFAULT_CATEGORY))
+
 def check_if_contact_admin(sender, instance, signal, *args, **kwargs):
     """ Checks if the removed user is the contact admin (and if so, sets the contact admin to null) """
     contact_admin_email = get_contact_admin_email()
@@ -120,10 +148,15 @@ def check_unique_poweruser(sender, instance, signal, *args, **kwargs):
 
         
 signals.post_save.connect(uncompress_file, sender=Application)
+signals.post_save.connect(make_icon_thumbnails, sender=Application)
 signals.post_save.connect(remove_extra_logs, sender=ApplicationLog)
 signals.post_delete.connect(remove_app, sender=Application)
 signals.post_delete.connect(check_if_contact_admin, sender=User)
 signals.post_save.connect(check_unique_poweruser, sender=User)
 signals.post_save.connect(check_if_no_longer_staff, sender=User)
+signals.post_save.connect(update_search_index, sender=Application)
+signals.post_save.connect(update_search_index, sender=Category)
+signals.post_save.connect(update_search_index, sender=User)
+signals.post_delete.connect(reindex_default_category, sender=Category)
 
 extracted_email_signal.connect(send_mail_when_app_available)
@@ -1,3 +1,4 @@
+import datetime
 from datetime import time
 
 from django.core import mail
@@ -51,6 +52,50 @@ class AdminTest(BaseTest):
         self.assertEqual(response.status_code, 302) # redirect to login
         self.assertRedirects(response, '/accounts/login/?next=/contact/')
 
+    def test_outbox(self):
+        """ Tests batching and retries of the queued e-mail """
+        from appman.utils.outbox import queue_mail, outbox_depth
+        connections = []
+        class FailingConnection(object):
+            def __init__(self):
+                connections.append(self)
+            def open(self):
+                pass
+            def close(self):
+                pass
+            def send_messages(self, messages):
+                if messages[0].to[0] == 'down@dei.uc.pt':
+                    raise IOError("Connection refused")
+                mail.outbox.extend(messages)
+        
+        mail.outbox = []
+        SMTPConnection, mail.SMTPConnection = mail.SMTPConnection, FailingConnection
+        try:
+            for i in range(3):
+                queue_mail('Message %s' % i, 'Body', settings.DEFAULT_FROM_EMAIL, ['user%s@dei.uc.pt' % i])
+            queue_mail('Retried', 'Body', settings.DEFAULT_FROM_EMAIL, ['down@dei.uc.pt'])
+            self.assertEqual(outbox_depth(), 4)
+            
+            now = datetime.datetime.now()
+            self.assertEqual(send_pending(now), 4)
+            self.assertEqual(len(connections), 1)
+            self.assertEqual([m.subject for m in mail.outbox], ['Message 0', 'Message 1', 'Message 2'])
+            self.assertEqual(outbox_depth(), 1)
+            
+            # Not due before the backoff delay
+            self.assertEqual(send_pending(now), 0)
+            later = now + datetime.timedelta(seconds=settings.OUTBOX_RETRY_DELAY)
+            self.assertEqual(send_pending(later), 1)
+            self.assertEqual(OutgoingEmail.objects.get().next_attempt, later + datetime.timedelta(seconds=2 * settings.OUTBOX_RETRY_DELAY))
+            
+            response = self.client.get('/outbox/')
+            self.assertEqual(response.status_code, 302)
+            self.do_admin_login()
+            response = self.client.get('/outbox/')
+            self.assertContains(response, '"depth": 1')
+        finally:
+            mail.SMTPConnection = SMTPConnection
+
     def test_contact(self):
         """ Sample test for a message to the designated contact administrator """
         # Clean email inbox
@@ -71,6 +116,8 @@ class AdminTest(BaseTest):
         response = self.client.post('/contact/', post_data)
         self.assertEqual(response.status_code, 200)
 
+        self.assertEqual(len(mail.outbox), 0)
+        send_pending()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(len(mail.outbox[0].to), 1)
         self.assertEqual(mail.outbox[0].to[0], get_contact_admin_email())
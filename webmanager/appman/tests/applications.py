@@ -1,4 +1,7 @@
+import cgi
 import datetime
+import shutil
+import time
 
 from django.core.files import File
 from django.core import mail
@@ -24,7 +27,74 @@ class ApplicationTest(BaseTest):
         self.gps.save()
         self.assertEqual( self.gps.value(), 0.625)
         self.assertEqual( self.gps.stars(), 3)
+        
+    def test_application_rating(self):
+        """ Tests if listings are ordered by the stored Wilson rating """
+        self.assertEqual(wilson_lower_bound(0, 0), 0)
+        self.assert_(0 < wilson_lower_bound(1, 0) < wilson_lower_bound(90, 10) < 0.9)
+        
+        lucky = Application.objects.create(name="Lucky", owner=self.zacarias, category=self.educational, likes=1)
+        popular = Application.objects.create(name="Popular", owner=self.zacarias, category=self.educational, likes=90, dislikes=10)
+        self.assertEqual(popular.rating, wilson_lower_bound(90, 10))
+        self.assertEqual(list(Application.objects.all()), [popular, lucky, self.gps])
+        
+        lucky.likes = 1000
+        lucky.save()
+        self.assertEqual(list(Application.objects.all()), [lucky, popular, self.gps])
 
+    def test_application_counters(self):
+        """ Tests if counters are incremented in the database without saving the application """
+        from django.db.models.signals import post_save
+        saved = []
+        def record_save(sender, instance, **kwargs):
+            saved.append(instance)
+        post_save.connect(record_save, sender=Application)
+        try:
+            stale = Application.objects.get(pk=self.gps.pk)
+            self.gps.increment(likes=1)
+            stale.increment(likes=1, runs=2)
+            stale.increment(dislikes=1)
+        finally:
+            post_save.disconnect(record_save, sender=Application)
+        self.assertEqual(saved, [])
+        
+        gps = Application.objects.get(pk=self.gps.pk)
+        self.assertEqual((gps.likes, gps.dislikes, gps.runs), (2, 1, 2))
+        self.assertEqual((stale.likes, stale.dislikes, stale.runs), (2, 1, 2))
+        self.assertEqual(gps.rating, wilson_lower_bound(2, 1))
+        self.assertRaises(ValueError, gps.increment, name=1)
+        
+    def test_icon_thumbnails(self):
+        """ Tests if icons get fixed-size thumbnails, regenerated when the icon changes """
+        import tempfile
+        from appman.utils.thumbnails import Image, make_thumbnails, delete_thumbnails, thumbnail_path
+        
+        media_root = settings.MEDIA_ROOT
+        settings.MEDIA_ROOT = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(settings.MEDIA_ROOT, 'icons'))
+            Image.new('RGB', (400, 200), (255, 0, 0)).save(os.path.join(settings.MEDIA_ROOT, 'icons', 'wide.jpg'))
+            make_thumbnails('icons/wide.jpg')
+            
+            for size in settings.ICON_THUMBNAIL_SIZES:
+                thumbnail = Image.open(thumbnail_path('icons/wide.jpg', size))
+                self.assertEqual(thumbnail.size, size)
+                self.assertEqual(thumbnail.mode, 'RGBA')
+                # Scaled keeping the aspect ratio, transparent above and below
+                self.assertEqual(thumbnail.getpixel((size[0] / 2, 0))[3], 0)
+                self.assertEqual(thumbnail.getpixel((size[0] / 2, size[1] / 2))[3], 255)
+            
+            path = thumbnail_path('icons/wide.jpg', settings.ICON_THUMBNAIL_SIZES[0])
+            os.utime(path, (0, 0))
+            make_thumbnails('icons/wide.jpg')
+            self.assertNotEqual(os.path.getmtime(path), 0)
+            
+            delete_thumbnails('icons/wide.jpg')
+            self.assertFalse(os.path.exists(path))
+        finally:
+            shutil.rmtree(settings.MEDIA_ROOT)
+            settings.MEDIA_ROOT = media_root
+    
     def test_application_log_representation(self):
         """ Tests if logs are well represented. """
         self.log = ApplicationLog.objects.create(application=self.gps, error_description="Error importing library X.")
@@ -126,6 +196,128 @@ class ApplicationTest(BaseTest):
         self.assertRedirects(response, '/applications/%s/' % Application.objects.get(name='Yet another App').id)
         os.remove(relative('../../media/applications', name))
 
+    def test_chunked_upload(self):
+        """ Tests a resumable upload, including a chunk sent at the wrong offset. """
+        from appman.utils.upload import ChunkedUpload, ChunkedUploadError, OffsetMismatch
+        data = open(relative('../../tests/python_test_app.zip'),'rb').read()
+        middle = len(data) / 2
+        
+        self.assertRaises(ChunkedUploadError, ChunkedUpload, self.zacarias.id, '')
+        self.assertRaises(ChunkedUploadError, ChunkedUpload, self.zacarias.id, '../../settings')
+        
+        upload = ChunkedUpload(self.zacarias.id, 'a1b2c3d4')
+        self.assertRaises(ChunkedUploadError, upload.append, 0, 'not a zip file', 100)
+        
+        self.assertFalse(upload.append(0, data[:middle], len(data)))
+        self.assertEqual(upload.offset(), middle)
+        self.assertFalse(upload.is_complete())
+        
+        # A dropped connection resumes from the stored offset
+        try:
+            upload.append(middle + 10, data[middle + 10:], len(data))
+            self.fail("Chunk at the wrong offset was accepted")
+        except OffsetMismatch, e:
+            self.assertEqual(e.offset, middle)
+        
+        self.assertTrue(upload.append(middle, data[middle:], len(data)))
+        self.assertTrue(upload.is_complete())
+        self.assertFalse(ChunkedUpload(self.zacarias.id, 'e5f6a7b8').is_complete())
+        
+        # An empty name is refused instead of looking for a free one forever
+        self.assertRaises(ChunkedUploadError, upload.finalize, '  ')
+        self.assertTrue(upload.is_complete())
+        
+        name = upload.finalize('C:\\Apps\\chunked_test_app.zip')
+        self.assertEqual(os.path.basename(name), 'chunked_test_app.zip')
+        self.assertEqual(open(relative('../../media', name), 'rb').read(), data)
+        self.assertEqual(upload.offset(), 0)
+        os.remove(relative('../../media', name))
+        
+    def test_chunked_upload_validation(self):
+        """ Tests if a zip file cut short or with a broken central directory is discarded. """
+        from appman.utils.upload import ChunkedUpload, ChunkedUploadError
+        data = open(relative('../../tests/python_test_app.zip'),'rb').read()
+        
+        upload = ChunkedUpload(self.zacarias.id, 'a1b2c3d4')
+        # The end of central directory of the whole file, behind a member cut short
+        broken = data[:len(data) / 2] + data[data.rindex('PK\x05\x06'):]
+        self.assertRaises(ChunkedUploadError, upload.append, 0, broken, len(broken))
+        self.assertFalse(upload.is_complete())
+        self.assertEqual(upload.offset(), 0)
+        
+    def test_chunked_upload_stale(self):
+        """ Tests if starting an upload removes the user's abandoned ones, and only those. """
+        from appman.utils.upload import ChunkedUpload
+        data = open(relative('../../tests/python_test_app.zip'),'rb').read()
+        
+        stale = ChunkedUpload(self.zacarias.id, 'aaaaaaaa')
+        recent = ChunkedUpload(self.zacarias.id, 'bbbbbbbb')
+        other = ChunkedUpload(self.alfredo.id, 'cccccccc')
+        for upload in (stale, recent, other):
+            upload.append(0, data[:10], len(data))
+        old = time.time() - settings.UPLOAD_PART_MAX_AGE - 60
+        os.utime(stale.path, (old, old))
+        os.utime(other.path, (old, old))
+        
+        ChunkedUpload(self.zacarias.id, 'dddddddd').append(0, data[:10], len(data))
+        self.assertFalse(os.path.exists(stale.path))
+        self.assertTrue(os.path.exists(recent.path))
+        self.assertTrue(os.path.exists(other.path))
+        
+        for token in ('bbbbbbbb', 'dddddddd'):
+            ChunkedUpload(self.zacarias.id, token).discard()
+        other.discard()
+        
+    def test_chunked_upload_view(self):
+        """ Tests adding an application with a zip file sent through the chunked upload view. """
+        login = self.do_login()
+        data = open(relative('../../tests/python_test_app.zip'),'rb').read()
+        middle = len(data) / 2
+        url = '/applications/upload/chunk/?token=a1b2c3d4&offset=%s&size=%s'
+        
+        response = self.client.get('/applications/upload/chunk/')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url % (0, len(data)), data[:middle], content_type='application/octet-stream')
+        self.assertContains(response, '"complete": false')
+        response = self.client.get('/applications/upload/chunk/?token=a1b2c3d4')
+        self.assertContains(response, '"offset": %s' % middle)
+        response = self.client.post(url % (middle, len(data)), data[middle:], content_type='application/octet-stream')
+        self.assertContains(response, '"complete": true')
+        
+        # Only the form with the upload's token gets the file
+        gps_zipfile = self.gps.zipfile.name
+        self.client.post('/applications/%s/edit/' % self.gps.id, {'hidFileID': 'chunked_app.zip'})
+        self.client.post('/applications/%s/edit/' % self.gps.id, {'hidFileID': '', 'upload_token': 'a1b2c3d4'})
+        self.assertEqual(Application.objects.get(id=self.gps.id).zipfile.name, gps_zipfile)
+        
+        pf = open(relative('../../tests/wmlogo.png'),'rb')
+        response = self.client.post('/applications/add/', {
+            'name': 'Chunked App',
+            'hidFileID': 'chunked_app.zip',
+            'upload_token': 'a1b2c3d4',
+            'icon': pf,
+            'category': self.educational.id,
+            'description': "Example app",
+            'tos': True
+        })
+        pf.close()
+        app = Application.objects.get(name='Chunked App')
+        self.assertRedirects(response, '/applications/%s/' % app.id)
+        self.assertEqual(open(app.zipfile.path, 'rb').read(), data)
+        os.remove(app.zipfile.path)
+        
+    def test_store_upload(self):
+        """ Tests if uploads are moved into the applications folder without a copy. """
+        temp_path = fullpath('store_test.zip', media_subfolder=settings.ZIP_TEMP_FOLDER)
+        open(temp_path, 'wb').write('zip data')
+        inode = os.stat(temp_path).st_ino
+        
+        name = store_upload(temp_path)
+        self.assertEqual(name, '%s/store_test.zip' % settings.ZIP_FOLDER)
+        self.assertFalse(os.path.exists(temp_path))
+        self.assertEqual(os.stat(fullpath('store_test.zip')).st_ino, inode)
+        os.remove(fullpath('store_test.zip'))
+        
     def test_get_unique_path(self):
         """ Tests if get_unique_path works. """
     	new_file = 'test132.txt'
@@ -178,6 +370,19 @@ class ApplicationTest(BaseTest):
         self.assertContains(response, "Example App 2</a></td>")
         
 
+    def test_edit_app_with_named_file(self):
+        """ Tests if an archive named by hidFileID is copied, never shared with its application. """
+        login = self.do_login()
+        shutil.copy(relative('../../tests/python_test_app.zip'), fullpath('shared_test.zip'))
+        
+        self.client.post('/applications/%s/edit/' % self.gps.id, {'hidFileID': 'shared_test.zip'})
+        gps = Application.objects.get(id=self.gps.id)
+        self.assertNotEqual(gps.zipfile.path, fullpath('shared_test.zip'))
+        self.assertEqual(open(gps.zipfile.path, 'rb').read(), open(fullpath('shared_test.zip'), 'rb').read())
+        
+        os.remove(gps.zipfile.path)
+        os.remove(fullpath('shared_test.zip'))
+        
     def test_delete_app(self):
         """ Tests delete application page. """
         c = Application.objects.count()
@@ -213,6 +418,7 @@ class ApplicationTest(BaseTest):
         self.assertRedirects(response, '/applications/')
         self.assertEqual(c-1, Application.objects.count())
         
+        send_pending()
         self.assertEquals(len(mail.outbox), 1)
         self.assertTrue("Application removed from the wall" in mail.outbox[0].subject)
     
@@ -237,6 +443,7 @@ class ApplicationTest(BaseTest):
         response = self.client.post('/applications/%s/report_abuse/' % self.gps.id, post_data)
         self.assertRedirects(response, '/applications/')
 
+        send_pending()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(len(mail.outbox[0].to), 1)
         self.assertEqual(mail.outbox[0].to[0], get_contact_admin_email())
@@ -270,6 +477,88 @@ class ApplicationTest(BaseTest):
         response = self.client.post('/applications/search/', post_data)
         self.assertContains(response,  '<td>%s'%self.educational.name, 1) 
         
+    def test_search_ranking(self):
+        """ Tests accent folding, prefix matching and ranking of the search index """
+        from appman.utils.search import search_applications
+        self.zacarias.first_name = u"Jo\xe3o"
+        self.zacarias.save()
+        by_description = Application.objects.create(name="Puzzle", description="A multitouch game", owner=self.plum, category=self.educational)
+        by_name = Application.objects.create(name="Multitouch Painter", description="Paint things", owner=self.plum, category=self.educational)
+        
+        self.assertEqual(search_applications("multi"), [by_name, by_description])
+        self.assertEqual(search_applications("multi paint"), [by_name])
+        self.assertEqual(search_applications("joao"), [self.gps])
+        self.assertEqual(search_applications(u"Jo\xe3o gps"), [self.gps])
+        self.assertEqual(search_applications("nothing"), [])
+        
+        by_name.delete()
+        self.assertEqual(search_applications("multi"), [by_description])
+        
+    def test_keyset_pagination(self):
+        """ Tests if paging with cursors visits every application once, in order """
+        from appman.utils.paging import keyset_page
+        for i in range(7):
+            Application.objects.create(name="App %s" % i, owner=self.zacarias, category=self.educational, likes=i % 3)
+        expected = list(Application.objects.order_by('-likes', 'id'))
+        
+        seen = []
+        page = keyset_page(Application.objects.all(), ('-likes', 'id'), size=3)
+        seen += page.items
+        while page.has_next():
+            self.assertEqual(len(page.items), 3)
+            page = keyset_page(Application.objects.all(), ('-likes', 'id'), page.next_cursor, size=3)
+            seen += page.items
+        self.assertEqual(seen, expected)
+        
+    def test_application_page(self):
+        """ Tests the listing pages and the JSON endpoint used for infinite scrolling """
+        from django.utils import simplejson
+        settings.APPS_PAGE_SIZE, page_size = 2, settings.APPS_PAGE_SIZE
+        for i in range(3):
+            Application.objects.create(name="Paged %s" % i, owner=self.zacarias, category=self.educational)
+        login = self.do_login()
+        
+        response = self.client.get('/applications/cat/%s/' % self.educational.id)
+        self.assertContains(response, "<tr>", 3) # 2 apps, plus header
+        self.assertContains(response, 'id="more_apps"')
+        
+        seen = 2
+        cursor = cgi.parse_qs(response.context['next_params'])['after'][0]
+        while cursor:
+            response = self.client.get('/applications/page/', {'cat': self.educational.id, 'after': cursor})
+            page = simplejson.loads(response.content)
+            seen += page['html'].count('<tr>')
+            cursor = page['next']
+        self.assertEqual(seen, 4) # 3 apps, plus Gps Application
+        
+        response = self.client.get('/applications/page/', {'after': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+        settings.APPS_PAGE_SIZE = page_size
+        
+    def query_count(self, url):
+        """ Number of queries a page needs, as reported by the query count middleware """
+        settings.DEBUG = True
+        try:
+            response = self.client.get(url)
+        finally:
+            settings.DEBUG = False
+        self.assertEqual(response.status_code, 200)
+        return int(response['X-Query-Count'])
+        
+    def test_query_count(self):
+        """ Tests if listing, search and detail pages don't make a query per application """
+        login = self.do_login()
+        pages = ['/applications/', '/applications/search/?q=app', '/applications/%s/' % self.gps.id]
+        self.query_count(pages[0]) # fills the category cache
+        few = [self.query_count(url) for url in pages]
+        for i in range(10):
+            owner = User.objects.create_user(username="owner%s" % i, email="owner%s@dei.uc.pt" % i, password="owner")
+            category = Category.objects.create(name="Category %s" % i)
+            Application.objects.create(name="Application %s" % i, owner=owner, category=category)
+        self.query_count(pages[0])
+        many = [self.query_count(url) for url in pages]
+        self.assertEqual(few, many)
+        
     def test_category_filter(self):
         """ Tests if category filter works """
         login = self.do_login()
@@ -3,6 +3,7 @@ import re
 
 from django.core import mail
 from django.test import TestCase
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db.models.signals import pre_save, post_save, post_delete
 
@@ -10,6 +11,7 @@ from appman.utils.log_file import logger
 from appman.utils.fileutils import *
 from appman.models import *
 from appman.signals import *
+from appman.utils.outbox import send_pending
 
 DEFAULT_CATEGORY = "Others"
 APPS_MAX_LOG_ENTRIES = 5
@@ -18,13 +20,20 @@ class BaseTest(TestCase):
     def __init__(self, *args, **kwargs):
         super(BaseTest, self).__init__(*args, **kwargs)
         
-        # Turn off signals except remove_logs
+        # Turn off signals except remove_logs and the search index
         post_save.receivers = []
         post_delete.receivers = []
 
         post_save.connect(remove_extra_logs, sender=ApplicationLog)
+        post_save.connect(update_search_index, sender=Application)
+        post_save.connect(update_search_index, sender=Category)
+        post_save.connect(update_search_index, sender=User)
     
     def setUp(self):
+        # E-mail is sent by the tests with send_pending()
+        self.outbox_background = settings.OUTBOX_BACKGROUND
+        settings.OUTBOX_BACKGROUND = False
+        
         # Zacarias is a user who uploads apps
         self.zacarias = User.objects.create_user(username="zacarias_stu", email="zacarias@student.dei.uc.pt", password="zacarias")
         
@@ -74,4 +83,5 @@ class BaseTest(TestCase):
 
     def tearDown(self):
         open(self.logger.fname, "w").write("\n")
+        settings.OUTBOX_BACKGROUND = self.outbox_background
 
@@ -1,3 +1,5 @@
+import datetime
+
 from django.core import mail
 from django.core.files import File
 
@@ -17,6 +19,59 @@ class LoggingTest(BaseTest):
         self.assertEqual(ApplicationLog.objects.count(), APPS_MAX_LOG_ENTRIES)        
 
 
+    def test_log_retention(self):
+        """ Tests if logs are pruned by count, age and size. """
+        from appman.utils.log_retention import prune_logs
+        limits = settings.APPS_MAX_LOG_ENTRIES, settings.APPS_LOG_MAX_AGE, settings.APPS_LOG_MAX_BYTES
+        settings.APPS_MAX_LOG_ENTRIES, settings.APPS_LOG_MAX_AGE, settings.APPS_LOG_MAX_BYTES = 4, 30, 25
+        try:
+            now = datetime.datetime.now()
+            other = ApplicationLog.objects.create(application=self.gps, error_description="x")
+            other.application = Application.objects.create(name="Other", owner=self.zacarias, category=self.educational)
+            other.save()
+            for days, text in [(40, "old"), (3, "0123456789"), (2, "0123456789"), (1, "0123456789"), (0, "0123456789")]:
+                log = ApplicationLog.objects.create(application=self.gps, error_description=text)
+                ApplicationLog.objects.filter(id=log.id).update(datetime=now - datetime.timedelta(days=days))
+            
+            prune_logs(self.gps.id, now)
+            self.assertEqual([log.datetime for log in ApplicationLog.objects.filter(application=self.gps)],
+                             [now, now - datetime.timedelta(days=1)])
+            self.assertEqual(ApplicationLog.objects.filter(id=other.id).count(), 1)
+        finally:
+            settings.APPS_MAX_LOG_ENTRIES, settings.APPS_LOG_MAX_AGE, settings.APPS_LOG_MAX_BYTES = limits
+
+    def test_log_tail(self):
+        """ Tests following the output of a running application by byte offsets. """
+        import tempfile, shutil
+        from django.utils import simplejson
+        login = self.do_login()
+        url = '/applications/%s/log/tail/' % self.gps.id
+        runs_dir, settings.APPS_RUN_LOGS_DIR = settings.APPS_RUN_LOGS_DIR, tempfile.mkdtemp()
+        try:
+            tail = simplejson.loads(self.client.get(url).content)
+            self.assertEqual(tail['run'], None)
+            
+            os.mkdir(os.path.join(settings.APPS_RUN_LOGS_DIR, str(self.gps.id)))
+            path = os.path.join(settings.APPS_RUN_LOGS_DIR, str(self.gps.id), '20110101-100000-000000.log')
+            open(path + '.running', 'w').write("starting\n")
+            tail = simplejson.loads(self.client.get(url).content)
+            self.assertEqual((tail['data'], tail['offset'], tail['running']), ("starting\n", 9, True))
+            
+            open(path + '.running', 'a').write("still running\n")
+            os.rename(path + '.running', path)
+            tail = simplejson.loads(self.client.get(url, {'run': tail['run'], 'offset': tail['offset']}).content)
+            self.assertEqual((tail['data'], tail['offset'], tail['running']), ("still running\n", 23, False))
+            
+            # A new run is read from its beginning
+            open(path.replace('100000', '110000') + '.running', 'w').write("again\n")
+            tail = simplejson.loads(self.client.get(url, {'run': tail['run'], 'offset': tail['offset']}).content)
+            self.assertEqual((tail['data'], tail['offset']), ("again\n", 6))
+            
+            self.assertEqual(self.client.get(url, {'offset': 'x'}).status_code, 400)
+        finally:
+            shutil.rmtree(settings.APPS_RUN_LOGS_DIR)
+            settings.APPS_RUN_LOGS_DIR = runs_dir
+
     def test_logging(self):
         """ Tests logging capabilities """
         def check_contents(type_):
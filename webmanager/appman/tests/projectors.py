@@ -11,9 +11,22 @@ from appman.utils.projectors import *
 global local_log
 local_log = []
 
+global applied
+applied = {}
+
 class FakeProjectorManager(ProjectorManager):
     def __init__(self, ip):
         self.ip = ip
+        self.projector = ip
+    
+    def applied_schedule(self, day):
+        return applied.get((self.ip, day))
+    
+    def remember_schedule(self, day, schedule):
+        applied[(self.ip, day)] = schedule
+    
+    def close(self):
+        pass
     
     def login(self):
         local_log.append("login")
@@ -32,6 +45,7 @@ class ProjectorTest(TestCase):
     def setUp(self):
         global local_log
         local_log = []
+        applied.clear()
     
     def test_projector_sequence(self):
         """ Tests the sequence of projectors """
@@ -44,5 +58,83 @@ class ProjectorTest(TestCase):
         
         self.assertEquals(local_log, expected_log)
     
+    def test_unchanged_days_are_skipped(self):
+        """ Tests if only the days whose schedule changed are written again """
+        set_projectors_time((10,1), (10,2), (11,00), (12,00), 
+                klass=FakeProjectorManager, projector_ips = [None])
+        del local_log[:]
+        
+        set_projectors_time((10,1), (10,2), (11,00), (12,00), 
+                klass=FakeProjectorManager, projector_ips = [None])
+        self.assertEquals(local_log, ['login'])
+        del local_log[:]
+        
+        set_projectors_time((10,1), (10,2), (11,00), (13,00), 
+                klass=FakeProjectorManager, projector_ips = [None])
+        self.assertEquals(local_log, ['login'] + 2 * ['reset', 'set_time 1 11 0', 'set_time 0 13 0', 'enable'])
+        del local_log[:]
+        
+        # e.g. after a projector was reprogrammed by hand
+        set_projectors_time((10,1), (10,2), (11,00), (13,00), 
+                klass=FakeProjectorManager, projector_ips = [None], force=True)
+        self.assertEquals(local_log.count('enable'), 7)
+    
+    def test_schedule_store(self):
+        """ Tests if the schedule file is replaced in place, never missing for readers """
+        import os, tempfile
+        folder = tempfile.mkdtemp()
+        store = ScheduleStore(os.path.join(folder, 'schedules.json'))
+        store.set('a', 'monday', [[10, 0], [20, 0]])
+        store.set('a', 'sunday', [[11, 0], [19, 0]])
+        self.assertEquals(store.get('a', 'monday'), [[10, 0], [20, 0]])
+        self.assertEquals(store.get('a', 'sunday'), [[11, 0], [19, 0]])
+        self.assertEquals(os.listdir(folder), ['schedules.json'])
+        os.remove(store.path)
+        os.rmdir(folder)
+    
+    def test_projectors_in_parallel(self):
+        """ Tests if every projector is programmed, each with its own session """
+        set_projectors_time((10,1), (10,2), klass=FakeProjectorManager, projector_ips = ['a', 'b'])
+        self.assertEquals(local_log.count('login'), 2)
+        self.assertEquals(local_log.count('enable'), 14)
+    
+    def test_projector_states(self):
+        """ Tests if an unreachable projector doesn't hide the state of the others """
+        import socket
+        class StatusProjectorManager(FakeProjectorManager):
+            def projector_status(self):
+                if self.ip == 'down':
+                    raise socket.timeout("timed out")
+                return "ON"
+        
+        states = projector_states(klass=StatusProjectorManager, projector_ips=['up', 'down'])
+        self.assertEquals(states, {'up': 'ON', 'down': UNREACHABLE})
+    
+    def test_status_parser(self):
+        """ Tests the parsing of sample status pages, and that reading stops at the power state """
+        from cStringIO import StringIO
+        from appman.utils import projectors
+        from appman.utils.fileutils import relative
+        page = lambda name: open(relative("../../tests/projector_pages/%s" % name), 'rb').read()
+        
+        status = parse_status(page('status_on.html'))
+        self.assertEquals((status.power, status.lamp, status.errors), ('ON', 1, []))
+        status = parse_status(page('status_off.html'))
+        self.assertEquals((status.power, status.lamp, status.errors), ('OFF', 0, ['Temperature Error']))
+        self.assertEquals(parse_power(page('status_off.html')), 'OFF')
+        status = ProjectorStatus({'Lamp Error': 1, 'Lamp Status': 0, 'Power Status': 1})
+        self.assertEquals((status.power, status.lamp, status.errors), ('ON', 0, ['Lamp Error']))
+        self.assertEquals(parse_power('<html>Not found</html>'), 'REQUEST_ERROR')
+        
+        response = StringIO(page('status_on.html'))
+        read_size, projectors.READ_SIZE = projectors.READ_SIZE, 100
+        try:
+            match, finished = read_until(response, POWER_FIELD)
+        finally:
+            projectors.READ_SIZE = read_size
+        self.assertEquals(match.group(1), '1')
+        self.assertFalse(finished)
+        self.assert_(response.tell() < len(response.getvalue()) / 2)
+    
     def tearUp(self):
         pass
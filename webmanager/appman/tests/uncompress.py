@@ -1,16 +1,44 @@
+import os
+import shutil
+import tempfile
+
 from django.test import TestCase
 from django.core import mail
 from django.core.files import File
+from django.conf import settings
 
 from appman.utils.uncompress import UncompressThread
-from appman.utils.fileutils import relative
+from appman.utils.extract import ZipExtractor
+from appman.utils.fileutils import relative, fullpath
+from appman.utils.deploy import deployment_queue
 from appman.models import *
 from appman.signals import extracted_email_signal
+from appman.utils.outbox import send_pending
 
 class UncompressTest(TestCase):
     def setUp(self):
         self.zacarias = User.objects.create_user(username="zacarias_stu", email="zacarias@student.dei.uc.pt", password="zacarias")
         self.educational = Category.objects.create(name="Educational")
+        # E-mail is sent by the tests with send_pending()
+        self.outbox_background = settings.OUTBOX_BACKGROUND
+        settings.OUTBOX_BACKGROUND = False
+        # Saving an application deploys it in the background; keep those out of the repository
+        self.wall_app_dir = settings.WALL_APP_DIR
+        settings.WALL_APP_DIR = tempfile.mkdtemp()
+        # and remove the copies of the zip files saved in the media folder
+        self.media_files = set(os.listdir(fullpath('')))
+        
+    def tearDown(self):
+        settings.OUTBOX_BACKGROUND = self.outbox_background
+        deployment_queue.join()
+        shutil.rmtree(settings.WALL_APP_DIR, ignore_errors=True)
+        settings.WALL_APP_DIR = self.wall_app_dir
+        for name in set(os.listdir(fullpath(''))) - self.media_files:
+            os.remove(fullpath(name))
+        # Deployments record a manifest next to the extracted folder
+        manifest = relative("../tests/temp.manifest")
+        if os.path.exists(manifest):
+            os.remove(manifest)
         
     def test_zip_extraction(self):
         """ Tests if Zipfiles are extracted and email is sent. """
@@ -26,12 +54,256 @@ class UncompressTest(TestCase):
         thread = UncompressThread(Application, app, extract_folder, extracted_email_signal)
         thread.run()
     
+        send_pending()
         self.assertEquals(len(mail.outbox), 1)
         self.assertEquals(mail.outbox[0].subject, '[WallManager] Application successfully deployed')
         self.assertEquals(len(mail.outbox[0].to), 1)
         self.assertEquals(mail.outbox[0].to[0], 'zacarias@student.dei.uc.pt')
         self.assertEquals(mail.outbox[0].body, 'Your application, ' + app.name + ', has been successfully deployed.')
+        # Also shown on the site, whether the e-mail arrives or not
+        self.assertEquals(self.zacarias.get_and_delete_messages(), [mail.outbox[0].body])
     
         # Clean extracted folder
         import shutil
-        shutil.rmtree(extract_folder)
\ No newline at end of file
+        shutil.rmtree(extract_folder)
+
+    def test_streaming_extraction(self):
+        """ Tests if the extractor writes every member and reports progress. """
+        import os, shutil, zipfile
+        extract_folder = relative("../tests/temp")
+        zip_path = relative("../../tests/python_test_app.zip")
+        
+        reports = []
+        extractor = ZipExtractor(chunk_size=1024, progress=lambda done, total, name: reports.append((done, total)))
+        extracted = extractor.extract(zip_path, extract_folder)
+        
+        zf = zipfile.ZipFile(zip_path)
+        for info in zf.infolist():
+            if not info.filename.endswith('/'):
+                self.assertTrue(info.filename in extracted)
+                self.assertEquals(open(os.path.join(extract_folder, info.filename), 'rb').read(), zf.read(info.filename))
+        zf.close()
+        
+        self.assertTrue(os.path.exists(os.path.join(extract_folder, 'boot.bat')))
+        self.assertEquals(reports[-1][0], reports[-1][1])
+        
+        shutil.rmtree(extract_folder)
+
+    def test_deployment_queue(self):
+        """ Tests if a newer job supersedes a queued one for the same application. """
+        from appman.utils.deploy import DeploymentQueue, QUEUED, DEPLOYED
+        
+        class FakeJob(object):
+            def __init__(self, instance, runs):
+                self.instance = instance
+                self.runs = runs
+            def run(self):
+                self.runs.append(self)
+                return True
+        
+        app = Application.objects.create(name="Queue Testing", owner=self.zacarias, category=self.educational)
+        queue = DeploymentQueue(workers=1)
+        runs = []
+        first, second = FakeJob(app, runs), FakeJob(app, runs)
+        
+        # Hold the lock so no worker picks the first job before it is superseded
+        queue.lock.acquire()
+        queue.workers = 0
+        queue.lock.release()
+        queue.submit(first)
+        queue.submit(second)
+        self.assertEquals(queue.depth(), 1)
+        self.assertEquals(queue.status(app.id), QUEUED)
+        
+        queue.lock.acquire()
+        queue.workers = 1
+        queue.start_workers()
+        while queue.order or queue.active:
+            queue.changed.wait()
+        queue.lock.release()
+        
+        self.assertEquals(runs, [second])
+        self.assertEquals(queue.status(app.id), DEPLOYED)
+        
+    def test_forget_cancels_running_job(self):
+        """ Tests if forgetting an application cancels its deployment under way. """
+        import threading
+        from appman.utils.deploy import DeploymentQueue
+        
+        class BlockedJob(object):
+            def __init__(self, instance):
+                self.instance = instance
+                self.started = threading.Event()
+                self.release = threading.Event()
+                self.cancelled = False
+            def run(self):
+                self.started.set()
+                self.release.wait()
+                return not self.cancelled
+            def cancel(self):
+                self.cancelled = True
+        
+        app = Application.objects.create(name="Cancel Testing", owner=self.zacarias, category=self.educational)
+        queue = DeploymentQueue(workers=1)
+        job = BlockedJob(app)
+        queue.submit(job)
+        job.started.wait()
+        queue.forget(app.id)
+        self.assertTrue(job.cancelled)
+        job.release.set()
+        
+    def test_cancelled_deployment(self):
+        """ Tests if a cancelled deployment leaves neither folder nor manifest behind. """
+        import os
+        from appman.utils.extract import manifest_path
+        extract_folder = relative("../tests/cancelled")
+        
+        app = Application.objects.create(name="Cancelled Testing", owner=self.zacarias, category=self.educational)
+        app.zipfile = File(open(relative("../../tests/python_test_app.zip")))
+        app.save()
+        
+        thread = UncompressThread(Application, app, extract_folder, extracted_email_signal)
+        thread.cancel()
+        self.assertFalse(thread.run())
+        self.assertFalse(os.path.exists(extract_folder))
+        self.assertFalse(os.path.exists(extract_folder + '.staging'))
+        self.assertFalse(os.path.exists(manifest_path(extract_folder)))
+        self.assertFalse(Application.objects.get(id=app.id).is_extracted)
+
+    def test_unchanged_zip_is_not_redeployed(self):
+        """ Tests if a second deployment of the same zipfile is skipped. """
+        import os, shutil
+        extract_folder = relative("../tests/temp")
+        
+        app = Application.objects.create(name="Unchanged Testing", owner=self.zacarias, category=self.educational)
+        app.zipfile = File(open(relative("../../tests/python_test_app.zip")))
+        app.save()
+        
+        UncompressThread(Application, app, extract_folder, extracted_email_signal).run()
+        deployed = Application.objects.get(id=app.id)
+        self.assertTrue(deployed.is_extracted)
+        self.assertEquals(len(deployed.zipfile_hash), 40)
+        self.assertEquals(deployed.zipfile_size, os.path.getsize(app.zipfile.path))
+        
+        # A file left behind by the first deployment survives a skipped one
+        marker = os.path.join(extract_folder, 'marker.txt')
+        open(marker, 'w').write('deployed')
+        send_pending()
+        mail.outbox = []
+        
+        self.assertTrue(UncompressThread(Application, app, extract_folder, extracted_email_signal).run())
+        self.assertTrue(os.path.exists(marker))
+        send_pending()
+        self.assertEquals(len(mail.outbox), 0)
+        
+        shutil.rmtree(extract_folder)
+
+    def test_failed_update_keeps_previous_version(self):
+        """ Tests if an invalid update leaves the deployed version untouched. """
+        import os, shutil, zipfile
+        extract_folder = relative("../tests/temp")
+        invalid_zip = relative("../tests/no_boot.zip")
+        zf = zipfile.ZipFile(invalid_zip, 'w')
+        zf.writestr('readme.txt', 'There is no boot file here.')
+        zf.close()
+        
+        app = Application.objects.create(name="Staging Testing", owner=self.zacarias, category=self.educational)
+        app.zipfile = File(open(relative("../../tests/python_test_app.zip")))
+        app.save()
+        self.assertTrue(UncompressThread(Application, app, extract_folder, extracted_email_signal).run())
+        
+        app = Application.objects.get(id=app.id)
+        app.zipfile = File(open(invalid_zip))
+        app.save()
+        self.assertFalse(UncompressThread(Application, app, extract_folder, extracted_email_signal).run())
+        
+        self.assertTrue(os.path.exists(os.path.join(extract_folder, 'boot.bat')))
+        self.assertFalse(os.path.exists(extract_folder + '.staging'))
+        self.assertTrue(Application.objects.get(id=app.id).is_extracted)
+        
+        shutil.rmtree(extract_folder)
+        os.remove(invalid_zip)
+
+    def test_delta_update(self):
+        """ Tests if an update only touches the members that changed. """
+        import os, shutil, zipfile
+        from appman.utils.extract import read_manifest
+        extract_folder = relative("../tests/temp")
+        
+        def make_zip(path, members):
+            zf = zipfile.ZipFile(path, 'w')
+            for name, data in members:
+                zf.writestr(name, data)
+            zf.close()
+        
+        first_zip, second_zip = relative("../tests/first.zip"), relative("../tests/second.zip")
+        make_zip(first_zip, [('boot.bat', 'run'), ('same.txt', 'same'), ('changed.txt', 'old'), ('removed.txt', 'gone')])
+        make_zip(second_zip, [('boot.bat', 'run'), ('same.txt', 'same'), ('changed.txt', 'new'), ('lib/added.txt', 'added')])
+        
+        app = Application.objects.create(name="Delta Testing", owner=self.zacarias, category=self.educational)
+        app.zipfile = File(open(first_zip))
+        app.save()
+        self.assertTrue(UncompressThread(Application, app, extract_folder, extracted_email_signal).run())
+        self.assertEquals(sorted(read_manifest(extract_folder).keys()), ['boot.bat', 'changed.txt', 'removed.txt', 'same.txt'])
+        
+        # Files that were not rewritten keep this marker content
+        open(os.path.join(extract_folder, 'same.txt'), 'w').write('untouched')
+        # and the unchanged ones are linked into the new folder, not copied
+        inode = lambda name: os.stat(os.path.join(extract_folder, name)).st_ino
+        inodes = {'same.txt': inode('same.txt'), 'boot.bat': inode('boot.bat'), 'changed.txt': inode('changed.txt')}
+        
+        app = Application.objects.get(id=app.id)
+        app.zipfile = File(open(second_zip))
+        app.save()
+        thread = UncompressThread(Application, app, extract_folder, extracted_email_signal)
+        self.assertTrue(thread.run())
+        
+        read = lambda name: open(os.path.join(extract_folder, name)).read()
+        self.assertEquals(read('same.txt'), 'untouched')
+        self.assertEquals(read('changed.txt'), 'new')
+        self.assertEquals(read('lib/added.txt'), 'added')
+        self.assertFalse(os.path.exists(os.path.join(extract_folder, 'removed.txt')))
+        self.assertEquals(thread.total_bytes, len('new') + len('added'))
+        self.assertEquals(inode('same.txt'), inodes['same.txt'])
+        self.assertEquals(inode('boot.bat'), inodes['boot.bat'])
+        self.assertNotEquals(inode('changed.txt'), inodes['changed.txt'])
+        self.assertTrue('lib/added.txt' in read_manifest(extract_folder))
+        
+        shutil.rmtree(extract_folder)
+        for path in (first_zip, second_zip):
+            os.remove(path)
+        
+    def test_delta_update_failure(self):
+        """ Tests if an update failing halfway leaves the previous version deployed. """
+        import os, shutil, zipfile
+        extract_folder = relative("../tests/temp")
+        
+        def make_zip(path, members):
+            zf = zipfile.ZipFile(path, 'w')
+            for name, data in members:
+                zf.writestr(name, data)
+            zf.close()
+        
+        first_zip, second_zip = relative("../tests/first.zip"), relative("../tests/second.zip")
+        make_zip(first_zip, [('boot.bat', 'run'), ('changed.txt', 'old')])
+        # The unsafe member is refused after changed.txt was written
+        make_zip(second_zip, [('boot.bat', 'run'), ('changed.txt', 'new'), ('../escape.txt', 'out')])
+        
+        app = Application.objects.create(name="Delta Testing", owner=self.zacarias, category=self.educational)
+        app.zipfile = File(open(first_zip))
+        app.save()
+        self.assertTrue(UncompressThread(Application, app, extract_folder, extracted_email_signal).run())
+        deployed_hash = Application.objects.get(id=app.id).zipfile_hash
+        
+        app = Application.objects.get(id=app.id)
+        app.zipfile = File(open(second_zip))
+        app.save()
+        self.assertFalse(UncompressThread(Application, app, extract_folder, extracted_email_signal).run())
+        
+        self.assertEquals(open(os.path.join(extract_folder, 'changed.txt')).read(), 'old')
+        self.assertFalse(os.path.exists(extract_folder + '.staging'))
+        self.assertEquals(Application.objects.get(id=app.id).zipfile_hash, deployed_hash)
+        
+        shutil.rmtree(extract_folder)
+        for path in (first_zip, second_zip):
+            os.remove(path)
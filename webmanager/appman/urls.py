@@ -10,13 +10,17 @@ urlpatterns = patterns('appman.views',
 	url(r'^applications/$', 'application_list', name="application-list"),
 	url(r'^applications/add/$', 'application_add', name="application-add"),
 	url(r'^applications/upload/$', 'application_upload', name="application-upload"),
+	url(r'^applications/upload/chunk/$', 'application_upload_chunk', name="application-upload-chunk"),
 	url(r'^applications/(?P<object_id>\d+)/$', 'application_detail', name="application-detail"),
 	url(r'^applications/(?P<object_id>\d+)/edit/$', 'application_edit', name="application-edit"),
 	url(r'^applications/(?P<object_id>\d+)/delete/$', 'application_delete', name="application-delete"),
 	url(r'^applications/(?P<object_id>\d+)/log/$', 'application_log', name="application-log"),
+	url(r'^applications/(?P<object_id>\d+)/log/tail/$', 'application_log_tail', name="application-log-tail"),
+	url(r'^applications/(?P<object_id>\d+)/status/$', 'application_status', name="application-status"),
 	url(r'^applications/(?P<object_id>\d+)/remove/$', 'application_admin_remove', name="application-admin-remove"),
     url(r'^applications/(?P<object_id>\d+)/report_abuse/$', 'report_abuse', name="report-abuse"),
 	url(r'^applications/search/$', 'application_search', name="application-search"),
+	url(r'^applications/page/$', 'application_page', name="application-page"),
 	url(r'^applications/cat/(?P<object_id>\d+)/$', 'application_list', name="application-list"),
 	url(r'^applications/(?P<scope>\w+)/$', 'application_list', name="application-list"),
 	url(r'^categories/$', 'category_list', name="category-list"),
@@ -25,6 +29,7 @@ urlpatterns = patterns('appman.views',
 	url(r'^categories/(?P<object_id>\d+)/remove/$', 'category_remove', name="category-remove"),
 	
 	url(r'^reboot/$', 'reboot', name="reboot"),
+	url(r'^outbox/$', 'outbox_status', name="outbox-status"),
 	url(r'^projectors/$', 'projectors', name="projectors"),
 	url(r'^screensaver/$', 'screensaver', name="screensaver"),
 	url(r'^documentation/menu/$','documentation_menu', name="documentation-menu"),
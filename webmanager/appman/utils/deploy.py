@@ -0,0 +1,145 @@
+import threading
+
+from django.conf import settings
+
+from appman.utils.log_file import logger
+
+# Deployment states
+QUEUED = 'queued'
+DEPLOYING = 'deploying'
+DEPLOYED = 'deployed'
+FAILED = 'failed'
+NOT_DEPLOYED = 'not deployed'
+
+class DeploymentQueue(object):
+    """ Runs application deployments on a bounded number of worker threads.
+
+    Jobs are keyed by application id: submitting a job for an application
+    that is still waiting in the queue replaces the older job, so only the
+    newest upload is extracted. The same application is never deployed by
+    two workers at the same time.
+
+    Jobs may have a cancel() method, called by forget() on a job that is
+    already running. """
+
+    def __init__(self, workers=None):
+        self.workers = workers or getattr(settings, 'DEPLOY_WORKERS', 2)
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.pending = {}
+        self.order = []
+        self.active = {}  # app id -> running job
+        self.statuses = {}
+        self.threads = []
+
+    def submit(self, job):
+        """ Queues a job. The job must have an instance attribute and a run() method. """
+        app_id = job.instance.id
+        self.lock.acquire()
+        try:
+            if app_id not in self.pending:
+                self.order.append(app_id)
+            self.pending[app_id] = job
+            self.statuses[app_id] = QUEUED
+            self.start_workers()
+            self.changed.notifyAll()
+        finally:
+            self.lock.release()
+
+    def status(self, app_id):
+        """ Returns the deployment state of an application, or None if it is unknown. """
+        self.lock.acquire()
+        try:
+            return self.statuses.get(app_id)
+        finally:
+            self.lock.release()
+
+    def forget(self, app_id):
+        """ Drops a queued job and the known state of an application, and
+        cancels its running job. Returns once that job can't deploy anymore. """
+        self.lock.acquire()
+        try:
+            if app_id in self.pending:
+                del self.pending[app_id]
+                self.order.remove(app_id)
+            self.statuses.pop(app_id, None)
+            job = self.active.get(app_id)
+        finally:
+            self.lock.release()
+        if job is not None and hasattr(job, 'cancel'):
+            job.cancel()
+
+    def depth(self):
+        """ Number of jobs waiting for a worker. """
+        self.lock.acquire()
+        try:
+            return len(self.order)
+        finally:
+            self.lock.release()
+
+    def join(self):
+        """ Waits until no job is queued or running. """
+        self.lock.acquire()
+        try:
+            while self.order or self.active:
+                self.changed.wait()
+        finally:
+            self.lock.release()
+
+    def start_workers(self):
+        """ Starts worker threads up to the configured limit. Must hold the lock. """
+        self.threads = [t for t in self.threads if t.isAlive()]
+        while len(self.threads) < self.workers:
+            worker = threading.Thread(target=self.work)
+            worker.setDaemon(True)
+            self.threads.append(worker)
+            worker.start()
+
+    def next_job(self):
+        """ Pops the oldest job whose application is not being deployed. Must hold the lock. """
+        for app_id in self.order:
+            if app_id not in self.active:
+                self.order.remove(app_id)
+                return self.pending.pop(app_id)
+        return None
+
+    def work(self):
+        while True:
+            self.lock.acquire()
+            try:
+                job = self.next_job()
+                while job is None:
+                    self.changed.wait()
+                    job = self.next_job()
+                app_id = job.instance.id
+                self.active[app_id] = job
+                self.statuses[app_id] = DEPLOYING
+            finally:
+                self.lock.release()
+
+            try:
+                success = job.run()
+            except Exception, e:
+                logger.log_app_event(job.instance, "deploy error: " + str(e))
+                success = False
+
+            self.lock.acquire()
+            try:
+                self.active.pop(app_id, None)
+                if app_id not in self.pending:
+                    self.statuses[app_id] = success and DEPLOYED or FAILED
+                self.changed.notifyAll()
+            finally:
+                self.lock.release()
+
+deployment_queue = DeploymentQueue()
+
+def get_deployment_status(app):
+    """ Returns the deployment state of an application.
+
+    Falls back to is_extracted for applications this process has not
+    deployed, e.g. when polled from mtmenu. """
+    status = deployment_queue.status(app.id)
+    if status:
+        return status
+    return app.is_extracted and DEPLOYED or NOT_DEPLOYED
@@ -0,0 +1,130 @@
+import os
+import shutil
+import zipfile
+
+from django.utils import simplejson
+
+CHUNK_SIZE = 64 * 1024
+
+class UnsafeMemberError(Exception):
+    """ Raised when a zip member would be written outside the target directory. """
+    pass
+
+def manifest_of(zf):
+    """ Returns {name: [crc, size]} for the files of an open ZipFile, read from its central directory. """
+    manifest = {}
+    for info in zf.infolist():
+        if not info.filename.endswith('/'):
+            manifest[info.filename] = [info.CRC, info.file_size]
+    return manifest
+
+def manifest_path(dir):
+    """ The manifest of a deployed folder lives next to it, out of the application's reach. """
+    return os.path.abspath(dir) + '.manifest'
+
+def read_manifest(dir):
+    """ Returns the manifest of a deployed folder, or None if it is missing or unreadable. """
+    try:
+        f = open(manifest_path(dir))
+        try:
+            return simplejson.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return None
+
+def write_manifest(dir, manifest):
+    f = open(manifest_path(dir), 'w')
+    try:
+        simplejson.dump(manifest, f)
+    finally:
+        f.close()
+
+class ZipExtractor(object):
+    """ Extracts a zip file with constant memory usage.
+
+    The archive is opened only once and every member is streamed to disk
+    in chunks of chunk_size bytes, so big applications never have to fit
+    in memory. Directories are created as they are needed.
+
+    progress, if given, is called as progress(bytes_done, bytes_total, name)
+    after each member is written. """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+    def extract(self, file, dir):
+        """ Extracts the zip file to dir. Returns the manifest of the extracted files. """
+        zf = zipfile.ZipFile(file)
+        try:
+            self.extract_members(zf, zf.infolist(), dir)
+            return manifest_of(zf)
+        finally:
+            zf.close()
+
+    def update(self, file, dir, manifest):
+        """ Brings dir, extracted from an archive described by manifest, up to date with file.
+
+        Only members whose name, CRC or size changed are written, and files
+        that are no longer in the archive are deleted. Files the application
+        created itself are left alone. Returns the manifest of the new archive. """
+        zf = zipfile.ZipFile(file)
+        try:
+            new_manifest = manifest_of(zf)
+            changed = [info for info in zf.infolist()
+                       if info.filename in new_manifest and manifest.get(info.filename) != new_manifest[info.filename]]
+            self.extract_members(zf, changed, dir)
+        finally:
+            zf.close()
+
+        dir = os.path.abspath(dir)
+        for name in manifest:
+            if name not in new_manifest:
+                target = self.target_path(dir, name)
+                if os.path.isfile(target):
+                    os.remove(target)
+        return new_manifest
+
+    def extract_members(self, zf, members, dir):
+        """ Streams the given ZipInfo members of an open ZipFile to dir. """
+        dir = os.path.abspath(dir)
+        if not os.path.isdir(dir):
+            os.makedirs(dir)
+
+        total = sum([info.file_size for info in members])
+        done = 0
+        extracted = []
+        for info in members:
+            target = self.target_path(dir, info.filename)
+            if info.filename.endswith('/'):
+                self.makedirs(target)
+                continue
+
+            self.makedirs(os.path.dirname(target))
+            source = zf.open(info)
+            try:
+                outfile = open(target, 'wb')
+                try:
+                    shutil.copyfileobj(source, outfile, self.chunk_size)
+                finally:
+                    outfile.close()
+            finally:
+                source.close()
+
+            extracted.append(info.filename)
+            done += info.file_size
+            if self.progress:
+                self.progress(done, total, info.filename)
+        return extracted
+
+    def target_path(self, dir, name):
+        """ Returns the absolute path of a member, refusing paths that escape dir. """
+        target = os.path.abspath(os.path.join(dir, name))
+        if target != dir and not target.startswith(dir + os.sep):
+            raise UnsafeMemberError("Member %s is outside the target folder" % name)
+        return target
+
+    def makedirs(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
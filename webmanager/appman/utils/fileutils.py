@@ -1,7 +1,9 @@
 import os
 import shutil
+import hashlib
 
 from django.conf import settings
+from django.core.files.move import file_move_safe
 
 def relative(*x):
     return os.path.join(os.path.abspath(os.path.dirname(__file__)), *x)
@@ -16,6 +18,46 @@ def delete_path(filepath):
     if os.path.exists(filepath):
         os.remove(filepath)
         
+def file_digest(filepath, chunk_size=64 * 1024):
+    """ Returns the SHA-1 hex digest of a file, reading it in chunks. """
+    digest = hashlib.sha1()
+    f = open(filepath, 'rb')
+    try:
+        chunk = f.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(chunk_size)
+    finally:
+        f.close()
+    return digest.hexdigest()
+        
+def replace_file(src, dst):
+    """ Renames src over dst in one step, so readers find one file or the other, never none. """
+    if os.name == 'nt':
+        # os.rename doesn't replace an existing file on Windows
+        import ctypes
+        MOVEFILE_REPLACE_EXISTING = 0x1
+        if not ctypes.windll.kernel32.MoveFileExW(unicode(src), unicode(dst), MOVEFILE_REPLACE_EXISTING):
+            raise ctypes.WinError()
+    else:
+        os.rename(src, dst)
+        
+def link_file(src, dst):
+    """ Makes dst another name of the file src, or a copy of it where it can't be linked.
+    Returns True if linked. """
+    try:
+        if os.name == 'nt':
+            import ctypes
+            if not ctypes.windll.kernel32.CreateHardLinkW(unicode(dst), unicode(src), None):
+                raise ctypes.WinError()
+        else:
+            os.link(src, dst)
+        return True
+    except OSError:
+        # e.g. another filesystem, or one without hard links
+        shutil.copy2(src, dst)
+        return False
+        
 def move_file(src,dst):
     shutil.move(src,dst)
     
@@ -31,6 +73,16 @@ def get_unique_path(path):
         path = ".".join( parts )
     return path
     
+def store_upload(filepath, filename=None):
+    """
+    Moves an uploaded file into the applications folder under a unique name,
+    returning the name to be stored in a FileField. Within the same filesystem
+    this is a rename; the file is only copied (in chunks) across devices.
+    """
+    name = get_unique_path(os.path.basename(filename or filepath))
+    file_move_safe(filepath, fullpath(name))
+    return "%s/%s" % (settings.ZIP_FOLDER, name)
+    
 def get_filename_for_id(id):
     " Returns a filename unique for each user"
     return "user_%s.zip" % id     
\ No newline at end of file
@@ -0,0 +1,54 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from appman.models import Application, ApplicationLog
+
+def logs_to_keep(app_id, now=None):
+    """ Ids of the logs of an application that are within the retention limits.
+
+    The newest APPS_MAX_LOG_ENTRIES logs are kept, as long as they are less
+    than APPS_LOG_MAX_AGE days old and add up to at most APPS_LOG_MAX_BYTES
+    of error descriptions. The newest log is kept whatever its size. Only
+    the rows that may be kept are read, so the cost doesn't depend on how
+    many logs have piled up. """
+    logs = ApplicationLog.objects.filter(application=app_id)
+    if settings.APPS_LOG_MAX_AGE:
+        now = now or datetime.datetime.now()
+        logs = logs.filter(datetime__gte=now - datetime.timedelta(days=settings.APPS_LOG_MAX_AGE))
+    logs = logs.extra(select={'size': 'LENGTH(error_description)'})
+    newest = logs.order_by('-datetime', '-id').values_list('id', 'size')[:settings.APPS_MAX_LOG_ENTRIES]
+
+    keep = []
+    total = 0
+    for log_id, size in newest:
+        total += size or 0
+        if keep and settings.APPS_LOG_MAX_BYTES and total > settings.APPS_LOG_MAX_BYTES:
+            break
+        keep.append(log_id)
+    return keep
+
+def prune_logs(app_id, now=None):
+    """ Deletes the logs of an application outside the retention limits with a single DELETE.
+
+    Rows are deleted in SQL, without loading them or sending signals. """
+    keep = logs_to_keep(app_id, now)
+    sql = "DELETE FROM %s WHERE %s = %%s" % (
+        connection.ops.quote_name(ApplicationLog._meta.db_table),
+        connection.ops.quote_name(ApplicationLog._meta.get_field('application').column))
+    params = [app_id]
+    if keep:
+        sql += " AND %s NOT IN (%s)" % (connection.ops.quote_name('id'), ', '.join(['%s'] * len(keep)))
+        params += keep
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    transaction.commit_unless_managed()
+    return cursor.rowcount
+
+def prune_all_logs(now=None):
+    """ Applies the retention limits to every application, e.g. from a periodic job. """
+    deleted = 0
+    for app_id in Application.objects.values_list('id', flat=True):
+        deleted += prune_logs(app_id, now)
+    return deleted
@@ -0,0 +1,66 @@
+import os
+
+from django.conf import settings
+
+# Suffix of the output file of a run that hasn't finished (see mtmenu.output_capture)
+RUNNING_SUFFIX = '.running'
+
+def latest_run(app_id):
+    """ Returns (path, is_running) of the output file of the latest run of an application, or (None, False). """
+    folder = os.path.join(settings.APPS_RUN_LOGS_DIR, str(app_id))
+    try:
+        runs = sorted(os.listdir(folder))
+    except OSError:
+        return None, False
+    if not runs:
+        return None, False
+    return os.path.join(folder, runs[-1]), runs[-1].endswith(RUNNING_SUFFIX)
+
+def run_name(path):
+    """ Identifies a run whether it has finished or not. """
+    name = os.path.basename(path)
+    if name.endswith(RUNNING_SUFFIX):
+        name = name[:-len(RUNNING_SUFFIX)]
+    return name
+
+def read_from(path, offset=None, max_bytes=None):
+    """ Reads up to max_bytes of a file from offset. Returns (data, next_offset).
+
+    Without an offset, the last max_bytes are returned, as with tail. """
+    max_bytes = max_bytes or settings.LOG_TAIL_MAX_BYTES
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        # The run finished and its file was renamed in between
+        if path.endswith(RUNNING_SUFFIX):
+            return read_from(path[:-len(RUNNING_SUFFIX)], offset, max_bytes)
+        raise
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if offset is None:
+            offset = max(0, size - max_bytes)
+        offset = min(offset, size)
+        f.seek(offset)
+        data = f.read(max_bytes)
+    finally:
+        f.close()
+    return data, offset + len(data)
+
+def tail_run(app_id, run=None, offset=None):
+    """ The output of the latest run of an application from offset, as sent to the log page.
+
+    When run (as returned before) isn't the latest run, the new run is
+    read from its beginning. """
+    path, running = latest_run(app_id)
+    if path is None:
+        return {'run': None, 'running': False, 'data': '', 'offset': 0}
+    name = run_name(path)
+    if run is not None and run != name:
+        offset = 0
+    data, offset = read_from(path, offset)
+    return {
+        'run': name,
+        'running': running,
+        'data': data.decode('utf-8', 'replace'),
+        'offset': offset,
+    }
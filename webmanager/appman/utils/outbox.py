@@ -0,0 +1,123 @@
+import datetime
+import threading
+
+from django.conf import settings
+from django.core import mail
+
+from appman.models import OutgoingEmail
+from appman.utils.log_file import logger
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """ Stores a message to be sent in the background. Same arguments as send_mail.
+
+    The request (or deployment) that sends it doesn't wait for the mail
+    server, which may be slow or down. """
+    email = OutgoingEmail.objects.create(subject=subject, body=message, from_email=from_email,
+                                         recipients=','.join(recipient_list))
+    if settings.OUTBOX_BACKGROUND:
+        mail_sender.wake()
+    return email
+
+def outbox_depth():
+    """ Number of messages waiting to be sent. """
+    return OutgoingEmail.objects.count()
+
+def retry_delay(attempts):
+    """ Exponential backoff: OUTBOX_RETRY_DELAY seconds after the first failure, doubling each time. """
+    return datetime.timedelta(seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+class MailSender(object):
+    """ Sends the queued messages on a background thread.
+
+    Each batch of up to OUTBOX_BATCH_SIZE due messages is sent through a
+    single SMTP connection. A message that fails is tried again later with
+    exponential backoff, and dropped after OUTBOX_MAX_ATTEMPTS. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.sending = threading.Lock()
+        self.woken = False
+        self.thread = None
+
+    def wake(self):
+        """ Starts the sender if needed and tells it there is something to send. """
+        self.lock.acquire()
+        try:
+            if self.thread is None or not self.thread.isAlive():
+                self.thread = threading.Thread(target=self.work)
+                self.thread.setDaemon(True)
+                self.thread.start()
+            self.woken = True
+            self.changed.notifyAll()
+        finally:
+            self.lock.release()
+
+    def work(self):
+        while True:
+            self.lock.acquire()
+            try:
+                if not self.woken:
+                    self.changed.wait(settings.OUTBOX_POLL_INTERVAL)
+                self.woken = False
+            finally:
+                self.lock.release()
+            try:
+                while self.send_pending() == settings.OUTBOX_BATCH_SIZE:
+                    pass
+            except Exception, e: #Pokemon
+                logger.log("[%s] Mail sender failed: %s\n" % (datetime.datetime.today(), e))
+
+    def send_pending(self, now=None):
+        """ Sends one batch of due messages. Returns how many were tried. """
+        self.sending.acquire()
+        try:
+            now = now or datetime.datetime.now()
+            batch = list(OutgoingEmail.objects.filter(next_attempt__lte=now)[:settings.OUTBOX_BATCH_SIZE])
+            if not batch:
+                return 0
+
+            connection = mail.SMTPConnection()
+            try:
+                connection.open()
+            except Exception, e:
+                for email in batch:
+                    self.failed(email, e, now)
+                return len(batch)
+            try:
+                for email in batch:
+                    message = mail.EmailMessage(email.subject, email.body, email.from_email,
+                                                email.recipients.split(','), connection=connection)
+                    try:
+                        connection.send_messages([message])
+                    except Exception, e:
+                        self.failed(email, e, now)
+                    else:
+                        email.delete()
+            finally:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            return len(batch)
+        finally:
+            self.sending.release()
+
+    def failed(self, email, error, now):
+        email.attempts += 1
+        email.last_error = str(error)
+        if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            logger.log("[%s] Giving up on e-mail '%s' to %s: %s\n" % (now, email.subject, email.recipients, error))
+            email.delete()
+        else:
+            email.next_attempt = now + retry_delay(email.attempts)
+            email.save()
+
+mail_sender = MailSender()
+
+def start_mail_sender():
+    """ Starts the background sender, which begins with the messages queued before a restart. """
+    mail_sender.wake()
+
+def send_pending(now=None):
+    return mail_sender.send_pending(now)
@@ -0,0 +1,73 @@
+import base64
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import simplejson
+
+class InvalidCursor(Exception):
+    pass
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(simplejson.dumps(values))
+
+def decode_cursor(cursor):
+    try:
+        return simplejson.loads(base64.urlsafe_b64decode(str(cursor)))
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+class Page(object):
+    """ A page of results and the cursor of the page after it (None on the last page). """
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+def keyset_page(queryset, ordering, cursor=None, size=None):
+    """ Returns the page of queryset that comes after cursor.
+
+    ordering is a sequence of field names, '-' prefixed when descending,
+    that must end in a unique field. Instead of an OFFSET, the page is
+    selected with a condition on the values of the last row of the
+    previous page (the cursor), so every page costs the same to fetch. """
+    size = size or settings.APPS_PAGE_SIZE
+    fields = [field.lstrip('-') for field in ordering]
+
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(fields):
+            raise InvalidCursor(cursor)
+        # (a, b) after (x, y) means a > x or (a == x and b > y), with < for descending fields
+        after = None
+        for i, field in enumerate(ordering):
+            lookup = field.startswith('-') and '__lt' or '__gt'
+            condition = Q(**{str(fields[i] + lookup): values[i]})
+            for j in range(i):
+                condition &= Q(**{str(fields[j]): values[j]})
+            if after is None:
+                after = condition
+            else:
+                after |= condition
+        queryset = queryset.filter(after)
+
+    items = list(queryset[:size + 1])
+    if len(items) <= size:
+        return Page(items, None)
+    items = items[:size]
+    return Page(items, encode_cursor([getattr(items[-1], field) for field in fields]))
+
+def list_page(items, cursor=None, size=None):
+    """ Pages through an already ranked list, e.g. search results. The cursor is a position. """
+    size = size or settings.APPS_PAGE_SIZE
+    start = 0
+    if cursor:
+        start = decode_cursor(cursor)
+        if not isinstance(start, int) or start < 0:
+            raise InvalidCursor(cursor)
+    end = start + size
+    if end < len(items):
+        return Page(items[start:end], encode_cursor(end))
+    return Page(items[start:end], None)
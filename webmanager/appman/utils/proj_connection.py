@@ -6,10 +6,11 @@ lock = threading.Lock()
 
 class ProjectorsThread(threading.Thread):
 	""" Thread that makes the conncetion to the rojectors."""
-	def __init__(self,proj):
+	def __init__(self,proj,force=False):
 		times = map(self.to_array,[proj.startup_week_time,proj.shutdown_week_time,
 				proj.startup_weekend_time,proj.shutdown_weekend_time])
 		self.week_on, self.week_off, self.weekend_on, self.weekend_off = times
+		self.force = force
 		threading.Thread.__init__(self)
 
 	def to_array(self,date):
@@ -18,7 +19,7 @@ class ProjectorsThread(threading.Thread):
 	def run(self):
 		lock.acquire()
 		try:
-			set_projectors_time(self.week_on, self.week_off, self.weekend_on, self.weekend_off)
+			set_projectors_time(self.week_on, self.week_off, self.weekend_on, self.weekend_off, force=self.force)
 		except Exception,e:
 			print e
 		lock.release()
@@ -1,10 +1,113 @@
+import httplib
+import os
+import re
+import socket
+import threading
 import urllib
-import urllib2
 
 from django.conf import settings
+from django.utils import simplejson
+
+from appman.utils.fileutils import replace_file
 
 
 PROJECTOR_IPS = settings.PROJECTOR_IPS or ('192.168.1.254', '192.168.1.253')
+UNREACHABLE = "UNREACHABLE"
+
+class ScheduleStore(object):
+    """ The schedule last written to each projector, kept in a JSON file.
+
+    It is shared by every process on the machine, so days whose schedule
+    didn't change are not written again. A projector reprogrammed by hand
+    gets out of sync with it; set_projectors_time(force=True) writes every
+    day again. """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            f = open(self.path)
+            try:
+                return simplejson.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return {}
+
+    def get(self, projector, day):
+        self.lock.acquire()
+        try:
+            return self.load().get(str(projector), {}).get(day)
+        finally:
+            self.lock.release()
+
+    def set(self, projector, day, schedule):
+        self.lock.acquire()
+        try:
+            schedules = self.load()
+            schedules.setdefault(str(projector), {})[day] = schedule
+            temp = self.path + '.tmp'
+            f = open(temp, 'w')
+            try:
+                simplejson.dump(schedules, f)
+            finally:
+                f.close()
+            replace_file(temp, self.path)
+        finally:
+            self.lock.release()
+
+schedule_store = ScheduleStore(settings.PROJECTOR_SCHEDULES_FILE)
+
+# Rows of the status page look like
+#   <th ...>Power Status</th><td nowrap ...><script language="JavaScript"><!--sts = "1";
+STATUS_FIELD = re.compile(r'<th[^>]*>\s*([^<]*?)\s*</th>\s*<td[^>]*>\s*<script[^>]*>\s*<!--\s*sts\s*=\s*"(\d+)";')
+POWER_FIELD = re.compile(r'Power Status\s*</th>\s*<td[^>]*>\s*<script[^>]*>\s*<!--\s*sts\s*=\s*"(\d+)";')
+LOGGED_IN = re.compile(r'sts\s*=\s*"2";')
+POWER_STATES = {0: "OFF", 1: "ON", 2: "COOL_DOWN"}
+REQUEST_ERROR = "REQUEST_ERROR"
+
+# Bytes read at a time when looking for a pattern, and kept between reads
+# so a match split across two reads is still found
+READ_SIZE = 1024
+READ_OVERLAP = 256
+
+class ProjectorStatus(object):
+    """ The status page of a projector: {label: code} of every row, with the common ones decoded. """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.power = POWER_STATES.get(fields.get('Power Status'), REQUEST_ERROR)
+        self.lamp = fields.get('Lamp Status')
+        self.errors = sorted([label for label, code in fields.items() if 'error' in label.lower() and code])
+
+    def __repr__(self):
+        return "<ProjectorStatus %s lamp=%s errors=%s>" % (self.power, self.lamp, self.errors)
+
+def parse_status(page):
+    """ Parses a whole status page into a ProjectorStatus. """
+    return ProjectorStatus(dict([(label, int(code)) for label, code in STATUS_FIELD.findall(page)]))
+
+def parse_power(page):
+    """ Returns the power state in a status page, or REQUEST_ERROR. """
+    match = POWER_FIELD.search(page)
+    if match:
+        return POWER_STATES.get(int(match.group(1)), REQUEST_ERROR)
+    return REQUEST_ERROR
+
+def read_until(response, pattern):
+    """ Reads a response until pattern is found. Returns (match or None, whether the response was read to the end). """
+    page = ''
+    while True:
+        data = response.read(READ_SIZE)
+        if not data:
+            return None, True
+        start = max(0, len(page) - READ_OVERLAP)
+        page = page[start:] + data
+        match = pattern.search(page)
+        if match:
+            return match, False
 
 class ProjectorManager():
 
@@ -16,27 +119,66 @@ class ProjectorManager():
 
     def __init__(self,projector_ip):
         self.projector = projector_ip
-        self.url = lambda day: 'http://%s/admin/%s.html' % (self.projector, day)
-        self.url_main = 'http://%s/main.html' % (self.projector)
-        self.url_status = 'http://%s/status.html' % (self.projector)
-    
+        self.url = lambda day: '/admin/%s.html' % day
+        self.url_main = '/main.html'
+        self.url_status = '/status.html'
+        self.connection = None
+        self.cookie = None
+
+    def request(self, path, values=None, until=None):
+        """ Sends a request on the kept-alive connection to the projector and returns the page.
+
+        Each attempt times out after PROJECTOR_TIMEOUT seconds, and failed
+        requests are retried PROJECTOR_RETRIES times on a new connection.
+
+        With a compiled pattern as until, the page is only read until the
+        pattern is found, and the match (or None) is returned instead. The
+        connection is then closed, since the rest of the page is unread. """
+        body = values is not None and urllib.urlencode(values) or None
+        headers = {}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+
+        for attempt in range(settings.PROJECTOR_RETRIES + 1):
+            try:
+                if self.connection is None:
+                    self.connection = httplib.HTTPConnection(self.projector, timeout=settings.PROJECTOR_TIMEOUT)
+                self.connection.request(body is None and 'GET' or 'POST', path, body, headers)
+                response = self.connection.getresponse()
+                if response.getheader('set-cookie'):
+                    self.cookie = response.getheader('set-cookie').split(';')[0]
+                if until is not None:
+                    match, finished = read_until(response, until)
+                    if not finished or response.will_close:
+                        self.close()
+                    return match
+                page = response.read()
+                if response.will_close:
+                    self.close()
+                return page
+            except (httplib.HTTPException, socket.error):
+                self.close()
+                if attempt == settings.PROJECTOR_RETRIES:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
     #returns true if successfully authenticated
     def login(self):
-        url = 'http://%s/index.html' % self.projector
         values = {'DATA1' : 'Administrator',
               'DATA2' : '' }
-        data = urllib.urlencode(values)
-        req = urllib2.Request(url, data)
-        response = urllib2.urlopen(req)
-        return 'sts = "2";' in response.read()
-        
+        return LOGGED_IN.search(self.request('/index.html', values)) is not None
+
     def enable(self,day):
         values = {'V1' : '1',
               'SetScheduleFlag' : '1' }
-        data = urllib.urlencode(values)
-        req = urllib2.Request(self.url(day), data)
-        urllib2.urlopen(req)
-    
+        self.request(self.url(day), values)
+
     #power is 1 when ON and 0 when OFF
     def set_time(self,day,hour,mint,power):
         values = {'V1' : '1',
@@ -46,9 +188,7 @@ class ProjectorManager():
                 'SetScheduleCommand' : '1',
                 'SetScheduleParam1' : str(power),
                 'ScheduleInfo' : '' }
-        data = urllib.urlencode(values)
-        req = urllib2.Request(self.url(day), data)
-        urllib2.urlopen(req)
+        self.request(self.url(day), values)
 
     def reset(self,day):
         values = {'V1' : '1',
@@ -58,72 +198,124 @@ class ProjectorManager():
             'D11' : '1',
             'V12' : '1',
             'D12' : '2' }
-        data = urllib.urlencode(values)
-        req = urllib2.Request(self.url(day), data)
-        urllib2.urlopen(req)
-        
+        self.request(self.url(day), values)
+
     def power_off(self):
         values = {'V2' : '1','D2' : '0'}
-        data = urllib.urlencode(values)
-        req = urllib2.Request(self.url_main, data)
-        urllib2.urlopen(req)
+        self.request(self.url_main, values)
 
     def power_on(self):
         values = {'V1' : '1','D1' : '1'}
-        data = urllib.urlencode(values)
-        req = urllib2.Request(self.url_main, data)
-        urllib2.urlopen(req)
-        
+        self.request(self.url_main, values)
+
     def projector_status(self):
-        dic = {0:"OFF" , 1:"ON", 2:"COOL_DOWN"}
-        status = lambda n: 'Power Status</th><td nowrap class="item_oparation_area"><script language="JavaScript"><!--sts = "%s";' % (str(n))
-        req = urllib2.Request(self.url_status)
-        response = urllib2.urlopen(req)
-        page = response.read()
-        clean_page = page.replace("\n",'').replace("\t",'').replace("\r",'')
-        for i in range(3):
-            if status(i) in clean_page:
-                return dic[i]
-        return "REQUEST_ERROR"
-
-def set_projectors_time(week_on, week_off, 
-        weekend_on=False, weekend_off=False, 
-        klass=ProjectorManager, projector_ips=PROJECTOR_IPS):
+        """ The power state, reading the status page only up to the Power Status row """
+        match = self.request(self.url_status, until=POWER_FIELD)
+        if match:
+            return POWER_STATES.get(int(match.group(1)), REQUEST_ERROR)
+        return REQUEST_ERROR
+
+    def status(self):
+        """ Everything the status page shows, as a ProjectorStatus """
+        return parse_status(self.request(self.url_status))
+
+    def applied_schedule(self, day):
+        """ The [on, off] times last written for a day, or None if unknown """
+        return schedule_store.get(self.projector, day)
+
+    def remember_schedule(self, day, schedule):
+        schedule_store.set(self.projector, day, schedule)
+
+def for_each_projector(fun, controllers):
+    """ Calls fun(projector) for every projector at the same time and waits for all of them.
+
+    Returns {projector: result}. If any call failed, the first error is
+    raised once the others have finished. """
+    results = {}
+    errors = []
+    def run(projector):
+        try:
+            try:
+                results[projector] = fun(projector)
+            except Exception, e:
+                errors.append(e)
+        finally:
+            projector.close()
+
+    threads = [threading.Thread(target=run, args=(projector,)) for projector in controllers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return results
+
+def set_projectors_time(week_on, week_off,
+        weekend_on=False, weekend_off=False,
+        klass=ProjectorManager, projector_ips=PROJECTOR_IPS, force=False):
+    """ Programs every projector to switch on and off at these times.
+    Days already programmed that way are skipped, unless forced. """
     controllers = map(klass, projector_ips)
     weekend_on = weekend_on or week_on
     weekend_off = weekend_off or week_off
-    
-    for projector in controllers:
-        if projector.login():
-            for day in projector.DAYS:
-                projector.reset(day)
-                
-                def set_hour(h_on, h_off):
-                    projector.set_time(day, h_on[0], h_on[1], projector.ON)
-                    projector.set_time(day, h_off[0], h_off[1], projector.OFF)
-                    
-                if day in projector.WEEKEND:
-                    set_hour(weekend_on, weekend_off)
-                else:
-                    set_hour(week_on, week_off)
-                
-                projector.enable(day)
+
+    def schedule(projector):
+        if not projector.login():
+            return
+        for day in projector.DAYS:
+            if day in projector.WEEKEND:
+                h_on, h_off = weekend_on, weekend_off
+            else:
+                h_on, h_off = week_on, week_off
+            wanted = [list(h_on), list(h_off)]
+            if not force and projector.applied_schedule(day) == wanted:
+                continue
+
+            projector.reset(day)
+            projector.set_time(day, h_on[0], h_on[1], projector.ON)
+            projector.set_time(day, h_off[0], h_off[1], projector.OFF)
+            projector.enable(day)
+            projector.remember_schedule(day, wanted)
+
+    for_each_projector(schedule, controllers)
 
 #power is 1 when ON and 0 when OFF
 def projectors_power(power, klass=ProjectorManager, projector_ips=PROJECTOR_IPS):
     controllers = map(klass, projector_ips)
-    for projector in controllers:
+    def switch(projector):
         if projector.login():
             if power:
                 projector.power_on()
             else:
                 projector.power_off()
+    for_each_projector(switch, controllers)
 
 #Returns a dictionary with the status of each projector
 def projectors_status(klass=ProjectorManager, projector_ips=PROJECTOR_IPS):
     controllers = map(klass, projector_ips)
-    dic = {}
-    for projector in controllers:
+    def status(projector):
         if projector.login():
-            dic[projector.projector] = projector.projector_status()
-    return dic
\ No newline at end of file
+            return projector.projector_status()
+    results = for_each_projector(status, controllers)
+    dic = {}
+    for projector, status in results.items():
+        if status is not None:
+            dic[projector.projector] = status
+    return dic
+
+def projector_states(klass=ProjectorManager, projector_ips=PROJECTOR_IPS):
+    """ Returns {ip: status} for every projector, polled at the same time.
+
+    Unlike projectors_status, a projector that can't be reached or refuses
+    the login doesn't fail the whole poll: its status is UNREACHABLE. """
+    controllers = map(klass, projector_ips)
+    def status(projector):
+        try:
+            if projector.login():
+                return projector.projector_status()
+        except (httplib.HTTPException, socket.error):
+            pass
+        return UNREACHABLE
+    results = for_each_projector(status, controllers)
+    return dict([(projector.projector, status) for projector, status in results.items()])
@@ -0,0 +1,77 @@
+import re
+import unicodedata
+
+from appman.models import Application, SearchTerm
+
+# How much a match in each field counts towards the ranking
+FIELD_WEIGHTS = (
+    ('name', 5),
+    ('category', 3),
+    ('owner_name', 2),
+    ('owner_email', 2),
+    ('description', 1),
+)
+
+TERM_MAX_LENGTH = 50
+
+def fold(text):
+    """ Lowercases text and strips accents, so searches ignore Portuguese diacritics. """
+    text = unicodedata.normalize('NFKD', unicode(text))
+    return u"".join([c for c in text if not unicodedata.combining(c)]).lower()
+
+def tokenize(text):
+    return [term[:TERM_MAX_LENGTH] for term in re.findall(r'\w+', fold(text), re.UNICODE)]
+
+def application_fields(app):
+    return {
+        'name': app.name,
+        'category': app.category.name,
+        'owner_name': u"%s %s" % (app.owner.first_name, app.owner.last_name),
+        'owner_email': app.owner.email,
+        'description': app.description,
+    }
+
+def index_application(app):
+    """ Replaces the search terms of an application. """
+    weights = {}
+    fields = application_fields(app)
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize(fields[field]):
+            weights[term] = weights.get(term, 0) + weight
+    
+    SearchTerm.objects.filter(application=app).delete()
+    for term, weight in weights.iteritems():
+        SearchTerm.objects.create(term=term, application=app, weight=weight)
+
+def rebuild_index(applications=None):
+    if applications is None:
+        applications = Application.objects.all()
+    for app in applications.select_related('owner', 'category'):
+        index_application(app)
+
+def search_applications(query, applications=None):
+    """ Returns the applications matching every word of query, best matches first.
+    
+    Words match terms that start with them. Applications are ranked by
+    the weight of the fields they matched, then by their rating. """
+    if applications is None:
+        applications = Application.objects.all()
+    terms = tokenize(query)
+    if not terms:
+        return list(applications)
+    
+    scores = None
+    for term in terms:
+        term_scores = {}
+        for app_id, weight in SearchTerm.objects.filter(term__startswith=term).values_list('application', 'weight'):
+            term_scores[app_id] = term_scores.get(app_id, 0) + weight
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = dict([(app_id, score + term_scores[app_id]) for app_id, score in scores.iteritems() if app_id in term_scores])
+        if not scores:
+            return []
+    
+    apps = list(applications.filter(id__in=scores.keys()))
+    apps.sort(key=lambda app: (scores[app.id], app.rating), reverse=True)
+    return apps
@@ -0,0 +1,55 @@
+import os
+
+from django.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+
+from appman.utils.fileutils import delete_path
+
+def thumbnail_name(icon_name, size):
+    """ Name, relative to MEDIA_ROOT, of the thumbnail of an icon at a size, e.g.
+    icons/thumbnails/tetris.png.80x80.png for icons/tetris.png at (80, 80). """
+    folder, filename = os.path.split(icon_name)
+    return os.path.join(folder, settings.ICON_THUMBNAIL_FOLDER, "%s.%dx%d.png" % ((filename,) + tuple(size)))
+
+def thumbnail_path(icon_name, size, media_root=None):
+    return os.path.join(media_root or settings.MEDIA_ROOT, thumbnail_name(icon_name, size))
+
+def make_thumbnail(source, destination, size):
+    """ Writes the image scaled to fit size, centered on a transparent size x size PNG.
+
+    Every thumbnail has the same size and format, whatever was uploaded,
+    so the wall decodes small files and uploads small textures. """
+    image = Image.open(source)
+    # Lets JPEG decode at a fraction of the size straight away
+    image.draft('RGB', size)
+    image = image.convert('RGBA')
+    image.thumbnail(size, Image.ANTIALIAS)
+
+    canvas = Image.new('RGBA', size, (0, 0, 0, 0))
+    canvas.paste(image, ((size[0] - image.size[0]) / 2, (size[1] - image.size[1]) / 2))
+
+    folder = os.path.dirname(destination)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    temp = destination + '.tmp'
+    canvas.save(temp, 'PNG')
+    delete_path(destination)
+    os.rename(temp, destination)
+
+def make_thumbnails(icon_name, force=False):
+    """ Generates the thumbnails of an icon in every ICON_THUMBNAIL_SIZES.
+    Thumbnails newer than the icon are kept unless forced. """
+    source = os.path.join(settings.MEDIA_ROOT, icon_name)
+    source_mtime = os.path.getmtime(source)
+    for size in settings.ICON_THUMBNAIL_SIZES:
+        destination = thumbnail_path(icon_name, size)
+        if force or not os.path.exists(destination) or os.path.getmtime(destination) < source_mtime:
+            make_thumbnail(source, destination, size)
+
+def delete_thumbnails(icon_name):
+    for size in settings.ICON_THUMBNAIL_SIZES:
+        delete_path(thumbnail_path(icon_name, size))
@@ -1,40 +1,172 @@
 import os
 import shutil
 import threading
+import time
+import zipfile
 
 from django.conf import settings
 
-import appman.utils.unzip as unzip
+from appman.utils.extract import ZipExtractor, UnsafeMemberError, read_manifest, write_manifest, manifest_path, manifest_of
+from appman.utils.fileutils import file_digest, delete_path, link_file
 from appman.utils.log_file import logger
 
 class UncompressThread(threading.Thread):
-    """ Thread that uncompresses a certain zip file."""
+    """ Thread that uncompresses a certain zip file.
+    
+    Deployments are usually run by the workers of appman.utils.deploy,
+    which call run() directly instead of starting a thread per upload."""
     def __init__(self, model, instance, path, signal):
         self.model = model
         self.instance = instance
         self.path = str(path)
+        self.staging_path = self.path + '.staging'
         self.signal = signal
+        self.manifest = None
+        self.extracted_bytes = 0
+        self.total_bytes = 0
+        self.cancelled = False
+        self.cancel_lock = threading.Lock()
         threading.Thread.__init__(self)
 
+    def cancel(self):
+        """ Stops the deployment from being swapped in, e.g. when the application is deleted.
+        If the swap is under way, waits for it to end. """
+        self.cancel_lock.acquire()
+        try:
+            self.cancelled = True
+        finally:
+            self.cancel_lock.release()
+        
     def post_signal(self, success=True ):
         if self.signal:
             self.signal.send(sender=self, application=self.instance, success=success)
             
+    def progress(self, done, total, name):
+        """ Called by the extractor after each member is written. """
+        self.extracted_bytes = done
+        self.total_bytes = total
+
+    def archive_signature(self):
+        """ Returns the (size, hash) pair of the zip file being deployed. """
+        path = str(self.instance.zipfile.path)
+        return os.path.getsize(path), file_digest(path)
+        
+    def is_deployed(self, size, digest):
+        """ Checks if this very zip file is already extracted in the app folder.
+        
+        The recorded signature is read from the database, as the instance
+        may be older than the last deployment. """
+        if not os.path.exists(os.path.join(self.path, 'boot.bat')):
+            return False
+        deployed = self.model.objects.filter(id=self.instance.id).values('is_extracted', 'zipfile_size', 'zipfile_hash')
+        if not deployed:
+            return False
+        deployed = deployed[0]
+        return deployed['is_extracted'] and deployed['zipfile_size'] == size and deployed['zipfile_hash'] == digest
+
     def prepare_folder(self):
         if not os.path.isdir(settings.WALL_APP_DIR):
             os.mkdir(settings.WALL_APP_DIR)
+        # Leftovers of an interrupted deployment
+        if os.path.isdir(self.staging_path):
+            shutil.rmtree(self.staging_path, ignore_errors=True)
             
-    def extract_file(self):
+    def safe_extract(self, fun):
+        """ Runs an extraction step, logging archive and filesystem errors. """
         try:
-            un = unzip.unzip()
-            un.extract(str(self.instance.zipfile.path) , self.path)
-            return os.path.exists(os.path.join(self.path, 'boot.bat'))
-        except unzip.zipfile.BadZipfile, e:
+            return fun()
+        except zipfile.BadZipfile, e:
             logger.log_app_event(self.instance, "BadZipfile:" + str(e))
             return False
+        except UnsafeMemberError, e:
+            logger.log_app_event(self.instance, "UnsafeMember:" + str(e))
+            return False
         except IOError, e:
             logger.log_app_event(self.instance, "IO:" + str(e))
             return False
+
+    def extract_file(self):
+        """ Extracts the zip file to the staging folder and checks it has a boot file. """
+        def extract():
+            extractor = ZipExtractor(progress=self.progress)
+            self.manifest = extractor.extract(str(self.instance.zipfile.path), self.staging_path)
+            return os.path.exists(os.path.join(self.staging_path, 'boot.bat'))
+        return self.safe_extract(extract)
+        
+    def update_file(self, manifest):
+        """ Rewrites only the files that changed since the deployed version.
+        
+        The staging folder is built from hard links to the files of the live
+        one that don't change, and the changed members are extracted next to
+        them; it is then swapped in like a full extraction, so a failure
+        halfway leaves the previous version deployed. """
+        def update():
+            zf = zipfile.ZipFile(str(self.instance.zipfile.path))
+            try:
+                if 'boot.bat' not in zf.namelist():
+                    return False
+                new_manifest = manifest_of(zf)
+            finally:
+                zf.close()
+            # Changed and removed members; the changed ones are extracted to new files
+            replaced = set([name for name in manifest if new_manifest.get(name) != manifest[name]])
+            try:
+                self.link_folder(replaced)
+            except (IOError, OSError), e:
+                logger.log_app_event(self.instance, "Link:" + str(e))
+                return False
+            extractor = ZipExtractor(progress=self.progress)
+            self.manifest = extractor.update(str(self.instance.zipfile.path), self.staging_path, manifest)
+            return os.path.exists(os.path.join(self.staging_path, 'boot.bat'))
+        return self.safe_extract(update)
+        
+    def link_folder(self, skip):
+        """ Fills the staging folder with links to the files of the live one,
+        except the members named in skip. Files the application created
+        itself are kept too. """
+        for folder, dirs, files in os.walk(self.path):
+            relative_folder = os.path.relpath(folder, self.path)
+            staging_folder = os.path.normpath(os.path.join(self.staging_path, relative_folder))
+            if not os.path.isdir(staging_folder):
+                os.makedirs(staging_folder)
+            for name in files:
+                member = os.path.normpath(os.path.join(relative_folder, name)).replace(os.sep, '/')
+                if member not in skip:
+                    link_file(os.path.join(folder, name), os.path.join(staging_folder, name))
+        
+    def save_manifest(self):
+        try:
+            write_manifest(self.path, self.manifest)
+        except (IOError, UnicodeDecodeError), e:
+            # Names that can't be recorded just mean a full extraction next time
+            logger.log_app_event(self.instance, "Manifest:" + str(e))
+            delete_path(manifest_path(self.path))
+            
+    def swap_folder(self):
+        """ Replaces the live folder by the staging one.
+        
+        The previous version is renamed out of the way and deleted in the
+        background, so the app folder is never missing or half-written. """
+        old_path = None
+        # Forget the manifest until the folder matches it again
+        delete_path(manifest_path(self.path))
+        try:
+            if os.path.isdir(self.path):
+                old_path = "%s.old.%d" % (self.path, int(time.time() * 1000))
+                os.rename(self.path, old_path)
+            os.rename(self.staging_path, self.path)
+        except OSError, e:
+            # e.g. the previous version is running and its files are locked
+            logger.log_app_event(self.instance, "Swap:" + str(e))
+            if old_path and not os.path.exists(self.path):
+                os.rename(old_path, self.path)
+            return False
+        
+        if old_path:
+            reclaim = threading.Thread(target=shutil.rmtree, args=(old_path, True))
+            reclaim.setDaemon(True)
+            reclaim.start()
+        return True
             
     def safe_call(self, fun):
         try:
@@ -49,20 +181,41 @@ class UncompressThread(threading.Thread):
                 raise e
             
     def run(self):
+        size, digest = self.archive_signature()
+        if self.is_deployed(size, digest):
+            # Metadata-only changes don't need a new deployment
+            logger.log_app_event(self.instance, 'unchanged')
+            return True
+        
         self.prepare_folder()
-        extracted = self.extract_file()
+        manifest = None
+        if os.path.isdir(self.path):
+            manifest = read_manifest(self.path)
+        if manifest is not None:
+            staged = self.update_file(manifest)
+        else:
+            staged = self.extract_file()
+        
+        self.cancel_lock.acquire()
+        try:
+            if self.cancelled:
+                logger.log_app_event(self.instance, 'deployment cancelled')
+                shutil.rmtree(self.staging_path, ignore_errors=True)
+                return False
+            extracted = staged and self.swap_folder()
+            if extracted:
+                self.save_manifest()
+        finally:
+            self.cancel_lock.release()
         
         if extracted:
             self.post_signal()
             
             def update_extracted():
-                self.model.objects.filter(id=self.instance.id).update(is_extracted=True)
+                self.model.objects.filter(id=self.instance.id).update(is_extracted=True, zipfile_size=size, zipfile_hash=digest)
             self.safe_call(update_extracted)
         else:
-            shutil.rmtree(self.path)
-            
-            def delete_extracted():
-                self.model.objects.filter(id=self.instance.id)
-            self.safe_call(delete_extracted)
-            
-            self.post_signal(False)
\ No newline at end of file
+            # The previous version, if any, stays deployed
+            shutil.rmtree(self.staging_path, ignore_errors=True)
+            self.post_signal(False)
+        return extracted
\ No newline at end of file
@@ -0,0 +1,119 @@
+import os
+import re
+import time
+import zipfile
+
+from django.conf import settings
+
+from appman.utils.fileutils import fullpath, delete_path, store_upload
+
+# Every zip file starts with a local file header (or, if empty, the end of central directory)
+ZIP_SIGNATURES = ('PK\x03\x04', 'PK\x05\x06')
+
+# Random id chosen by the form for each upload, so a form only gets the file it sent
+UPLOAD_TOKEN = re.compile(r'^[0-9a-f]{8,64}$')
+
+class ChunkedUploadError(Exception):
+    """ Raised when a chunk can't be accepted. """
+    pass
+
+class OffsetMismatch(ChunkedUploadError):
+    """ Raised when a chunk doesn't start where the stored data ends. """
+    def __init__(self, offset):
+        ChunkedUploadError.__init__(self, "Upload should continue at offset %s" % offset)
+        self.offset = offset
+
+class ChunkedUpload(object):
+    """ A resumable upload of a zip file, one chunk at a time.
+
+    Chunks are appended straight to a partial file in the applications
+    folder, which is renamed into place by finalize(), so the data is
+    written to disk only once. A client that lost its connection asks for
+    offset() and sends the rest from there.
+
+    Each upload is identified by the user and a token sent by the form, and
+    only the form that submits the same token can use the file. Partial
+    files a user left for more than UPLOAD_PART_MAX_AGE seconds are removed
+    when they start another upload. """
+
+    def __init__(self, user_id, token):
+        if not token or not UPLOAD_TOKEN.match(token):
+            raise ChunkedUploadError("Invalid upload token")
+        self.user_id = user_id
+        self.path = fullpath("user_%s_%s.part" % (user_id, token))
+
+    def offset(self):
+        """ Number of bytes stored so far. """
+        if os.path.exists(self.path):
+            return os.path.getsize(self.path)
+        return 0
+
+    def append(self, offset, data, total_size):
+        """ Stores a chunk that starts at offset. Returns True once the upload is complete. """
+        if total_size > settings.UPLOAD_MAX_SIZE:
+            raise ChunkedUploadError("File is bigger than %s bytes" % settings.UPLOAD_MAX_SIZE)
+        if offset + len(data) > total_size:
+            raise ChunkedUploadError("Chunk goes past the end of the file")
+
+        if offset == 0:
+            delete_path(self.path)
+            self.discard_stale()
+            if not data[:4] in ZIP_SIGNATURES:
+                raise ChunkedUploadError("Not a zip file")
+        elif offset != self.offset():
+            raise OffsetMismatch(self.offset())
+
+        destination = open(self.path, 'ab')
+        try:
+            destination.write(data)
+        finally:
+            destination.close()
+
+        if offset + len(data) < total_size:
+            return False
+        self.validate()
+        return True
+
+    def validate(self):
+        """ Reads the central directory of a complete upload, checking that
+        every member it lists lies within the file. Discards the upload if not. """
+        try:
+            archive = zipfile.ZipFile(self.path)
+            try:
+                size = os.path.getsize(self.path)
+                for info in archive.infolist():
+                    if info.header_offset + info.compress_size > size:
+                        raise zipfile.BadZipfile("%s is cut short" % info.filename)
+            finally:
+                archive.close()
+        except (zipfile.BadZipfile, IOError), e:
+            self.discard()
+            raise ChunkedUploadError("Not a valid zip file: %s" % e)
+
+    def is_complete(self):
+        return os.path.exists(self.path) and zipfile.is_zipfile(self.path)
+
+    def finalize(self, filename):
+        """ Validates the upload and moves it to its final name. Returns the name to store in a FileField. """
+        name = os.path.basename(filename.strip().replace('\\', '/'))
+        if name in ('', '.', '..'):
+            raise ChunkedUploadError("A file name is required")
+        self.validate()
+        return store_upload(self.path, name)
+
+    def discard(self):
+        delete_path(self.path)
+
+    def discard_stale(self, now=None):
+        """ Removes the partial files of this user's abandoned uploads """
+        now = now or time.time()
+        folder = os.path.dirname(self.path)
+        prefix = "user_%s_" % self.user_id
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if name.startswith(prefix) and name.endswith('.part') and path != self.path:
+                try:
+                    if now - os.path.getmtime(path) > settings.UPLOAD_PART_MAX_AGE:
+                        os.remove(path)
+                except OSError:
+                    pass
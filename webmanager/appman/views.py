@@ -1,9 +1,10 @@
 import os
-from smtplib import SMTPException
 
 from django.views.generic.list_detail import *
 from django.views.generic.create_update import *
 from django.shortcuts import render_to_response, get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.template import RequestContext
 from django.http import HttpResponse, HttpResponseRedirect, HttpResponseBadRequest, Http404
@@ -13,6 +14,7 @@ from django.contrib.sites.models import Site
 from django.conf import settings
 from django.contrib.flatpages.models import FlatPage
 from django.db.models import Q
+from django.utils import simplejson
 
 from appman.forms import *
 from appman.models import *
@@ -20,8 +22,17 @@ from appman.decorators import *
 from appman.utils.fileutils import *
 from appman.utils import get_contact_admin_email, reboot_os
 from appman.utils.proj_connection import ProjectorsThread
+from appman.utils.deploy import get_deployment_status, deployment_queue
+from appman.utils.upload import ChunkedUpload, ChunkedUploadError, OffsetMismatch
+from appman.utils.search import search_applications
+from appman.utils.paging import keyset_page, list_page, InvalidCursor
+from appman.utils.log_tail import tail_run
+from appman.utils.outbox import queue_mail, outbox_depth
 from appman.utils.response import HttpRedirectException
 
+# Listings are ordered by rating, with the id as a tie-breaker for the page cursors
+APPLICATION_ORDERING = ('-rating', 'id')
+
 # Helper
 
 def render(request, template, opts = {}):
@@ -29,7 +40,7 @@ def render(request, template, opts = {}):
 
 def get_app_or_error(user, id):
     try:
-        app = Application.objects.get(id=id)
+        app = Application.objects.select_related('owner', 'category').get(id=id)
     except Application.DoesNotExist:
         user.message_set.create(message="Invalid application's ID: %s." % id)
         raise HttpRedirectException(reverse('application-list'))
@@ -51,19 +62,19 @@ def contact(request):
                 %s' % (request.user.email, form.cleaned_data['message'])
             email_from = settings.DEFAULT_FROM_EMAIL
             email_to = get_contact_admin_email()
-            try:
-                send_mail(subject, message, email_from, [email_to])
-                request.user.message_set.create(message="Your message was sent successfully to the designated contact administrator.")
-                return application_list(request)
-            except SMTPException, e:
-                request.user.message_set.create(message="Unable to send your message. Please try again later.")
+            queue_mail(subject, message, email_from, [email_to])
+            request.user.message_set.create(message="Your message was sent successfully to the designated contact administrator.")
+            return application_list(request)
     else:
         form = MessageToAdminForm()
     return render(request,'appman/contact.html',{'form': form})
     
-@login_required
-def application_list(request, scope='', object_id=False):
-    cs = Application.objects.all()
+def get_listed_applications(request, scope='', object_id=False, query=None):
+    """ Returns the applications of a listing and its category (if any). 
+    Search results come as a ranked list, other listings as a queryset. """
+    if query is not None:
+        return search_applications(query, Application.objects.select_related('owner', 'category')), ''
+    cs = Application.objects.select_related('owner', 'category')
     cat = ''
     if scope == 'mine':
         cs = cs.filter(owner = request.user)
@@ -73,28 +84,52 @@ def application_list(request, scope='', object_id=False):
             cs = cs.filter(category = cat)
         except Category.DoesNotExist:
             cat = ""
-            
-    return render(request,'appman/application_list.html', {
-            'application_list': cs,
-            'categories': Category.objects.all(),
-            'cat': cat
-        })
+    return cs, cat
+    
+def get_page(request, applications):
+    """ Returns the page of applications after the ?after= cursor. """
+    cursor = request.GET.get('after')
+    try:
+        if isinstance(applications, list):
+            return list_page(applications, cursor)
+        return keyset_page(applications, APPLICATION_ORDERING, cursor)
+    except InvalidCursor:
+        raise Http404
+        
+def render_application_list(request, applications, extra_context, page_params):
+    page = get_page(request, applications)
+    next_params = ''
+    if page.has_next():
+        page_params['after'] = page.next_cursor
+        next_params = urlencode(page_params)
+    extra_context.update({
+        'application_list': page.items,
+        'categories': get_categories(),
+        'next_params': next_params,
+    })
+    return render(request,'appman/application_list.html', extra_context)
+
+@login_required
+def application_list(request, scope='', object_id=False):
+    cs, cat = get_listed_applications(request, scope, object_id)
+    page_params = {'scope': scope, 'cat': object_id or ''}
+    return render_application_list(request, cs, {'cat': cat}, page_params)
 
 @login_required
 def application_search(request):
-    q = request.POST.get('q','')
-    cs = Application.objects.filter(
-            Q(name__icontains = q) |
-            Q(description__contains = q) |
-            Q(category__name__icontains = q) |
-            Q(owner__first_name__icontains = q) |
-            Q(owner__email__icontains = q)
-        )
-    return render(request,'appman/application_list.html', {
-            'application_list': cs,
-            'categories': Category.objects.all(),
-            'query': q 
-        })
+    q = request.REQUEST.get('q','')
+    cs, cat = get_listed_applications(request, query=q)
+    return render_application_list(request, cs, {'query': q}, {'q': q})
+    
+@login_required
+def application_page(request):
+    """ Returns the rows of the next page of a listing as JSON, for infinite scrolling. 
+    Takes the scope, cat or q parameters of the listing and the after cursor. """
+    q = request.GET.get('q')
+    cs, cat = get_listed_applications(request, request.GET.get('scope', ''), request.GET.get('cat', ''), q)
+    page = get_page(request, cs)
+    html = render_to_string('appman/application_rows.html', {'application_list': page.items})
+    return HttpResponse(simplejson.dumps({'html': html, 'next': page.next_cursor}), mimetype="application/json")
 
 @login_required
 def application_log(request, object_id):
@@ -102,35 +137,69 @@ def application_log(request, object_id):
     app = get_app_or_error(request.user, object_id)
     return render(request,'appman/application_log.html', {'logs': cs,'identifier':object_id, 'appname':app.name})
 
+@login_required
+def application_log_tail(request, object_id):
+    """ Returns the output of the latest run of an application from a byte offset, as JSON, to be polled. """
+    app = get_object_or_404(Application, id=object_id)
+    offset = request.GET.get('offset')
+    if offset is not None:
+        try:
+            offset = int(offset)
+            if offset < 0:
+                raise ValueError(offset)
+        except ValueError:
+            return HttpResponseBadRequest("Invalid offset", mimetype="text/plain")
+    tail = tail_run(app.id, request.GET.get('run'), offset)
+    return HttpResponse(simplejson.dumps(tail), mimetype="application/json")
+
+@login_required
+def application_status(request, object_id):
+    """ Returns the deployment state of an application as JSON, to be polled. """
+    app = get_object_or_404(Application, id=object_id)
+    status = {
+        'status': get_deployment_status(app),
+        'is_extracted': app.is_extracted,
+        'queue_depth': deployment_queue.depth(),
+    }
+    return HttpResponse(simplejson.dumps(status), mimetype="application/json")
+
 @login_required
 def application_add(request):
     form_class = ApplicationAddForm
     if request.method == 'POST':
         temporary_named_path = ""
+        chunked_upload = None
         form = form_class(request.POST, request.FILES)
         if 'hidFileID' in request.POST and request.POST['hidFileID']:
-            # If SWFUpload was used, hidFieldID is set to the filename
+            # If SWFUpload or the chunked upload was used, hidFieldID is set to the filename
             uploaded_file = request.POST['hidFileID'].strip()
             
             # The file is saved on a temporary zip named user_ID.zip to prevent duplicates
             # Then we rename it to the real filename before saving to the database.
             
             user_unique_path = fullpath(get_filename_for_id(request.user.id), media_subfolder=settings.ZIP_TEMP_FOLDER)
-            temporary_named_path = fullpath(get_unique_path(uploaded_file), media_subfolder=settings.ZIP_TEMP_FOLDER)
-
-            if os.path.exists(user_unique_path):
+            upload = get_chunked_upload(request)
+            
+            if upload:
+                form.fields['zipfile'].required=False # allow form validation
+                chunked_upload = upload
+            elif os.path.exists(user_unique_path):
                 form.fields['zipfile'].required=False # allow form validation
-                move_file(user_unique_path, temporary_named_path)
+                temporary_named_path = user_unique_path
                 
         if form.is_valid():
             app = form.save(commit=False)
             app.owner = request.user
-            if temporary_named_path:
-                app.zipfile = File(open("%s" % temporary_named_path))
-                app.save()
-                delete_path(temporary_named_path)
-            else:
-                app.save()            
+            if chunked_upload:
+                try:
+                    app.zipfile = chunked_upload.finalize(uploaded_file)
+                except ChunkedUploadError, e:
+                    request.user.message_set.create(message="The uploaded file was not accepted: %s" % e)
+                    return HttpResponseRedirect(reverse('application-add'))
+            elif temporary_named_path:
+                # Renamed into the applications folder instead of being copied
+                app.zipfile = store_upload(temporary_named_path, uploaded_file)
+            app.save()
             request.user.message_set.create(message="Application successfully submitted." )
             return HttpResponseRedirect(reverse('application-detail', args=[str(app.id)]))
         else:
@@ -165,10 +234,52 @@ def application_upload(request):
     else:
         return HttpResponseRedirect(reverse('application-add'))
 
+def get_chunked_upload(request):
+    """ The complete chunked upload the form names with upload_token, if any """
+    try:
+        upload = ChunkedUpload(request.user.id, request.POST.get('upload_token', ''))
+    except ChunkedUploadError:
+        return None
+    if upload.is_complete():
+        return upload
+    return None
+
+@login_required
+def application_upload_chunk(request):
+    """ Resumable upload of a zip file, sent as raw chunks.
+    
+    Every request names the upload with ?token=, a random id chosen by the
+    form. GET returns the offset where the upload should continue. POST
+    appends the request body at ?offset=N of a file of ?size=M bytes. Once
+    the last chunk arrives, the form is submitted with hidFileID set to the
+    filename and upload_token to the token. """
+    try:
+        upload = ChunkedUpload(request.user.id, request.GET.get('token', ''))
+    except ChunkedUploadError, e:
+        return HttpResponseBadRequest(str(e), mimetype="text/plain")
+    if request.method != 'POST':
+        return HttpResponse(simplejson.dumps({'offset': upload.offset()}), mimetype="application/json")
+    
+    try:
+        offset = int(request.GET['offset'])
+        size = int(request.GET['size'])
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("offset and size are required", mimetype="text/plain")
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        return HttpResponseBadRequest("Chunks can't be bigger than %s bytes" % settings.UPLOAD_CHUNK_MAX_SIZE, mimetype="text/plain")
+    
+    try:
+        complete = upload.append(offset, request.raw_post_data, size)
+    except OffsetMismatch, e:
+        return HttpResponse(simplejson.dumps({'offset': e.offset}), mimetype="application/json", status=409)
+    except ChunkedUploadError, e:
+        return HttpResponseBadRequest(str(e), mimetype="text/plain")
+    return HttpResponse(simplejson.dumps({'offset': upload.offset(), 'complete': complete}), mimetype="application/json")
+
 def application_detail(request,object_id,form=ReportAbuseForm()):
-    cs = Application.objects.all()
     app = get_app_or_error(request.user, object_id)
-    return object_detail(request, extra_context={'form': form}, object_id=object_id, queryset=cs, template_object_name="application")
+    return render(request, 'appman/application_detail.html', {'application': app, 'object': app, 'form': form})
 
 @staff_login_required
 def application_admin_remove(request,object_id):
@@ -183,7 +294,7 @@ def application_admin_remove(request,object_id):
         email_from = settings.DEFAULT_FROM_EMAIL
         email_to = app.owner.email
         message = 'Your application, ' + app.name + ', has been removed from the wallmanager by the staff for not respecting the Terms of Service.'
-        send_mail('[WallManager] Application removed from the wall.', message, email_from, [email_to])
+        queue_mail('[WallManager] Application removed from the wall.', message, email_from, [email_to])
     
         request.user.message_set.create(message="Application %s removed successfully."%(app.name))
     
@@ -193,16 +304,30 @@ def application_admin_remove(request,object_id):
 @login_required
 def application_edit(request, object_id):
     if request.method == 'POST' and 'hidFileID' in request.POST:
-        filepath = fullpath(request.POST['hidFileID'].strip())
+        filepath = fullpath(os.path.basename(request.POST['hidFileID'].strip()))
         app = get_app_or_error(request.user, object_id)
         
         if app.is_running:
             request.user.message_set.create(message="Application %s is running on the Wall. Please finish it to remove." % app.name)
             return HttpResponseRedirect(reverse('application-detail',args=[app.id]))
 
-        if filepath and os.path.isfile(filepath):
-            app.zipfile = File(open(filepath))
-            app.save()
+        chunked_upload = get_chunked_upload(request)
+        if chunked_upload:
+            try:
+                app.zipfile = chunked_upload.finalize(request.POST['hidFileID'])
+                app.save()
+            except ChunkedUploadError, e:
+                request.user.message_set.create(message="The uploaded file was not accepted: %s" % e)
+                return HttpResponseRedirect(reverse('application-edit', args=[app.id]))
+        elif filepath and os.path.isfile(filepath):
+            # Copied, so the application never shares its archive with another one,
+            # which deleting or replacing either of them would remove
+            zip_file = open(filepath, 'rb')
+            try:
+                app.zipfile = File(zip_file)
+                app.save()
+            finally:
+                zip_file.close()
 
     return update_object(request, form_class=ApplicationEditForm, 
             object_id=object_id, post_save_redirect=reverse('application-detail', args=[str(object_id)]))
@@ -235,11 +360,8 @@ def report_abuse(request, object_id):
         
             %s """ % (request.user.email.strip(), app.name, current_site.domain, app.get_absolute_url(), abuse_description) 
 
-            try:
-                send_mail('[WallManager] Application ' + app.name + ' received an abuse report.', message, email_from, [email_to])
-                request.user.message_set.create(message="Application %s reported successfully." % app.name)
-            except:
-                request.user.message_set.create(message="Failure while sending e-mail message containing the report. Please try again later.")
+            queue_mail('[WallManager] Application ' + app.name + ' received an abuse report.', message, email_from, [email_to])
+            request.user.message_set.create(message="Application %s reported successfully." % app.name)
         else:
             return application_detail(request, object_id, form)
         return HttpResponseRedirect(reverse('application-list'))
@@ -252,6 +374,15 @@ def superuser_required(login_url=None):
     return user_passes_test(lambda u: u.is_superuser, login_url=login_url)
     
 #Admin Views
+@staff_required()
+def outbox_status(request):
+    """ Returns the number of e-mail messages waiting to be sent as JSON. """
+    status = {
+        'depth': outbox_depth(),
+        'retrying': OutgoingEmail.objects.filter(attempts__gt=0).count(),
+    }
+    return HttpResponse(simplejson.dumps(status), mimetype="application/json")
+
 @staff_required()
 def projectors(request):
     obj, flag = ProjectorControl.objects.get_or_create(id=1)
@@ -259,9 +390,9 @@ def projectors(request):
         form = ProjectorControlForm(request.POST, instance=obj)
         if form.is_valid():
             new_proj = form.save()
-            thread = ProjectorsThread(new_proj)	
+            thread = ProjectorsThread(new_proj, form.cleaned_data['force'])
             thread.start()
-            request.user.message_set.create(message="Projector settings will be modified. This operation may take up to 10 minutes.")
+            request.user.message_set.create(message="Projector settings will be modified. This operation may take a minute.")
             return HttpResponseRedirect(reverse('projectors'))
     else:
         form = ProjectorControlForm(instance=obj)
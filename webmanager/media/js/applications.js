@@ -11,3 +11,37 @@ function toggle(id) {
         e.style.display="none";
     }
 }
+
+// Infinite scroll: when the bottom of the list comes into view, the rows
+// of the next page are fetched and appended instead of following the link.
+var loadingApps = false;
+
+function loadMoreApps() {
+    var link = document.getElementById('more_apps');
+    if (!link || loadingApps || !window.XMLHttpRequest) return;
+    var bottom = link.getBoundingClientRect().top;
+    if (bottom > (window.innerHeight || document.documentElement.clientHeight) + 200) return;
+
+    loadingApps = true;
+    var xhr = new XMLHttpRequest();
+    xhr.open("GET", link.rel, true);
+    xhr.onreadystatechange = function() {
+        if (xhr.readyState != 4) return;
+        loadingApps = false;
+        if (xhr.status != 200) return;
+        var page = JSON.parse(xhr.responseText);
+        var rows = document.createElement('tbody');
+        rows.innerHTML = page.html;
+        document.getElementById('applist').getElementsByTagName('table')[0].appendChild(rows);
+        if (page.next) {
+            var params = link.rel.replace(/after=[^&]*/, "after=" + encodeURIComponent(page.next));
+            link.rel = params;
+            link.href = "?" + params.split("?")[1];
+        } else {
+            link.parentNode.removeChild(link);
+        }
+    };
+    xhr.send(null);
+}
+
+window.onscroll = loadMoreApps;
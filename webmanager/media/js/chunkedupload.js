@@ -0,0 +1,95 @@
+// Resumable upload of the application zip file.
+// The file is sent in chunks to the chunk upload view before the form is
+// submitted; if the connection drops, the upload continues where the
+// server says it stopped instead of starting over.
+//
+// Each upload has a random token, sent with every chunk and then with the
+// form, so the form only gets the file it uploaded.
+
+var CHUNK_SIZE = 1024 * 1024;
+var MAX_RETRIES = 5;
+
+function ChunkedUpload(file, url, onProgress, onDone, onError) {
+    this.file = file;
+    this.url = url;
+    this.onProgress = onProgress;
+    this.onDone = onDone;
+    this.onError = onError;
+    this.retries = 0;
+    this.token = ChunkedUpload.newToken();
+}
+
+ChunkedUpload.newToken = function() {
+    var token = "";
+    for (var i = 0; i < 32; i++) {
+        token += Math.floor(Math.random() * 16).toString(16);
+    }
+    return token;
+};
+
+ChunkedUpload.supported = function() {
+    return window.File && window.Blob && window.XMLHttpRequest &&
+        (Blob.prototype.slice || Blob.prototype.webkitSlice || Blob.prototype.mozSlice);
+};
+
+ChunkedUpload.prototype.chunkUrl = function(query) {
+    return this.url + "?token=" + this.token + (query ? "&" + query : "");
+};
+
+ChunkedUpload.prototype.start = function() {
+    this.send(0);
+};
+
+ChunkedUpload.prototype.resume = function() {
+    // Ask the server how much it already has
+    var self = this;
+    var xhr = new XMLHttpRequest();
+    xhr.open("GET", this.chunkUrl(), true);
+    xhr.onreadystatechange = function() {
+        if (xhr.readyState != 4) return;
+        if (xhr.status == 200) {
+            self.send(JSON.parse(xhr.responseText).offset);
+        } else {
+            self.retry();
+        }
+    };
+    xhr.send(null);
+};
+
+ChunkedUpload.prototype.retry = function() {
+    var self = this;
+    if (++this.retries > MAX_RETRIES) {
+        this.onError("The upload failed. Please try again later.");
+        return;
+    }
+    setTimeout(function() { self.resume(); }, 1000 * this.retries);
+};
+
+ChunkedUpload.prototype.send = function(offset) {
+    var self = this;
+    var file = this.file;
+    var end = Math.min(offset + CHUNK_SIZE, file.size);
+    var slice = file.slice || file.webkitSlice || file.mozSlice;
+    var xhr = new XMLHttpRequest();
+
+    xhr.open("POST", this.chunkUrl("offset=" + offset + "&size=" + file.size), true);
+    xhr.setRequestHeader("Content-Type", "application/octet-stream");
+    xhr.onreadystatechange = function() {
+        if (xhr.readyState != 4) return;
+        if (xhr.status == 200 || xhr.status == 409) {
+            var state = JSON.parse(xhr.responseText);
+            self.retries = 0;
+            self.onProgress(state.offset, file.size);
+            if (state.complete) {
+                self.onDone(file.name, self.token);
+            } else {
+                self.send(state.offset);
+            }
+        } else if (xhr.status == 400) {
+            self.onError(xhr.responseText);
+        } else {
+            self.retry();
+        }
+    };
+    xhr.send(slice.call(file, offset, end));
+};
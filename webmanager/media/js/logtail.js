@@ -0,0 +1,53 @@
+// Live output of the latest run of an application.
+// The tail view is polled with the byte offset reached so far, so only the
+// output written since the last poll is transferred.
+
+var TAIL_INTERVAL = 2000;
+var TAIL_MAX_CHARS = 200000;
+
+function LogTail(output, state) {
+    this.output = output;
+    this.state = state;
+    this.url = output.getAttribute('rel');
+    this.run = null;
+    this.offset = null;
+}
+
+LogTail.prototype.poll = function() {
+    var self = this;
+    var url = this.url;
+    if (this.run !== null) {
+        url += "?run=" + encodeURIComponent(this.run) + "&offset=" + this.offset;
+    }
+    var xhr = new XMLHttpRequest();
+    xhr.open("GET", url, true);
+    xhr.onreadystatechange = function() {
+        if (xhr.readyState != 4) return;
+        if (xhr.status == 200) {
+            self.show(JSON.parse(xhr.responseText));
+        }
+        setTimeout(function() { self.poll(); }, TAIL_INTERVAL);
+    };
+    xhr.send(null);
+};
+
+LogTail.prototype.show = function(tail) {
+    if (tail.run === null) return;
+    document.getElementById('livelog').style.display = "block";
+    if (tail.run != this.run) {
+        this.output.innerHTML = "";
+    }
+    this.run = tail.run;
+    this.offset = tail.offset;
+    this.state.innerHTML = tail.running ? "(running)" : "(finished)";
+    if (tail.data) {
+        var text = this.output.textContent + tail.data;
+        this.output.textContent = text.substring(Math.max(0, text.length - TAIL_MAX_CHARS));
+    }
+};
+
+window.onload = function() {
+    var output = document.getElementById('livelog_output');
+    if (!output || !window.XMLHttpRequest) return;
+    new LogTail(output, document.getElementById('livelog_state')).poll();
+};
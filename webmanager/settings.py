@@ -25,6 +25,11 @@ EMAIL_HOST_PASSWORD = ''
 EMAIL_USE_TLS = False
 DEFAULT_FROM_EMAIL = 'no-reply@sensewall.dei.uc.pt'
 DEFAULT_TO_EMAIL = 'wallmanager@dei.uc.pt'
+OUTBOX_BACKGROUND = True # Send queued e-mail from a background thread
+OUTBOX_BATCH_SIZE = 20 # Messages sent through one SMTP connection
+OUTBOX_POLL_INTERVAL = 60 # Seconds between checks for messages due to be retried
+OUTBOX_RETRY_DELAY = 60 # Seconds before the first retry, doubled on each failure
+OUTBOX_MAX_ATTEMPTS = 8
 
 SECRET_KEY = '%4)e8snda5-cewqsjx#%t$sg-j0txw)mb%leue1_^paa=(ft)e' # <------ Change this!
 
@@ -72,6 +77,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'appman.middleware.swfupload.SWFUploadMiddleware',
     'appman.middleware.redirecter.Redirecter',
+    'appman.middleware.querycount.QueryCountMiddleware',
     'django.contrib.flatpages.middleware.FlatpageFallbackMiddleware',
 )
 
@@ -87,12 +93,27 @@ AUTH_LDAP_USER_BASE = lambda email: "uid=%s,ou=%s,ou=People,dc=dei,dc=uc,dc=pt"
 AUTH_LDAP_CERT = ""
 
 WALL_APP_DIR = relative('../mtmenu/apps/')
+APPS_RUN_LOGS_DIR = relative('../mtmenu/logs/runs/') # Output of each run, written by the wall menu
+LOG_TAIL_MAX_BYTES = 64 * 1024 # Most output returned by one request of the live log
 ZIP_FOLDER = "applications"
 ZIP_TEMP_FOLDER = "app_temp"
+DEPLOY_WORKERS = 2 # Number of applications extracted at the same time
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 4 * 1024 * 1024 # Largest chunk accepted by the resumable upload
+UPLOAD_PART_MAX_AGE = 24 * 60 * 60 # Seconds before an unfinished resumable upload is removed
+ICON_THUMBNAIL_FOLDER = "thumbnails" # Inside the icons folder
+ICON_THUMBNAIL_SIZES = ((80, 80), (160, 160)) # Thumbnails made of each icon, for the wall and high-DPI screens
 
 DEFAULT_CATEGORY = "Others"
 APPS_MAX_LOG_ENTRIES = 3
+APPS_LOG_MAX_AGE = 90 # Days a log is kept, None to keep them regardless of age
+APPS_LOG_MAX_BYTES = 256 * 1024 # Total size of the logs kept per application, None for no limit
+APPS_PAGE_SIZE = 50 # Applications per page of the listings
+CATEGORIES_CACHE_TIMEOUT = 60 # Seconds other processes may show a stale category list
 
 LOG_FILENAME = relative('log.txt')
 
 PROJECTOR_IPS = ('192.168.1.254', '192.168.1.253')
+PROJECTOR_TIMEOUT = 10 # Seconds to wait for each request to a projector
+PROJECTOR_RETRIES = 2 # Times a failed request to a projector is repeated
+PROJECTOR_SCHEDULES_FILE = relative('db/projector_schedules.json') # Schedules last written to the projectors
@@ -6,6 +6,11 @@ from appman.admin import EmailAdmin
 admin.site = EmailAdmin()
 admin.autodiscover()
 
+if settings.OUTBOX_BACKGROUND:
+    # Otherwise mail left queued by the previous run waits for the next one to be queued
+    from appman.utils.outbox import start_mail_sender
+    start_mail_sender()
+
 urlpatterns = patterns('',
 
     (r'^admin/(.*)', admin.site.root),